@@ -0,0 +1,48 @@
+import argparse
+import numpy as np
+
+from Bench_Common import run_scenario
+
+BACKENDS = ('ipopt', 'sqp', 'rti')
+
+
+def run_backend(scenario_num, backend, qp_solver, sim_time):
+    """Run one closed-loop simulation and return (solve times, mean iterations, ego y and vx histories)"""
+    sim, _ = run_scenario(scenario_num, sim_time, mpc_kwargs={'backend': backend, 'qp_solver': qp_solver})
+    return (np.array(sim.solve_time_history), np.mean(sim.mpc.iter_counts),
+            np.array(sim.ego_y_history), np.array(sim.ego_vx_history), sim.mpc.qp_solver)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the IPOPT, SQP and real-time iteration MPC backends")
+    parser.add_argument('--sim-time', type=float, default=30.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--qp-solver', default=None, help="CasADi conic plugin for SQP/RTI (default: osqp, else qrqp)")
+    args = parser.parse_args()
+
+    rows = []
+    for scenario in args.scenarios:
+        results = {backend: run_backend(scenario, backend, args.qp_solver, args.sim_time) for backend in BACKENDS}
+        _, _, y_ref, vx_ref, _ = results['ipopt']
+        qp_solver = results['rti'][4]
+        for backend, (solve_time, iters, y, vx, _) in results.items():
+            rows.append((scenario, backend, np.percentile(solve_time, 50), np.percentile(solve_time, 95), iters,
+                         np.max(np.abs(y - y_ref)), np.max(np.abs(vx - vx_ref))))
+
+    print(f"\nQP solver of sqp/rti: {qp_solver}")
+    print(f"{'scenario':>8} {'backend':>8} {'p50 ms':>8} {'p95 ms':>8} {'iters':>6} {'max |dy|':>10} {'max |dvx|':>10}")
+    for scenario, backend, p50, p95, iters, dy, dvx in rows:
+        print(f"{scenario:>8} {backend:>8} {1e3 * p50:>8.2f} {1e3 * p95:>8.2f} {iters:>6.1f} {dy:>10.2e} {dvx:>10.2e}")
+
+    # Whether real-time iteration actually lowers the latency below the full IPOPT solve
+    print()
+    latency = {(scenario, backend): (p50, p95) for scenario, backend, p50, p95, *_ in rows}
+    for scenario in args.scenarios:
+        (ipopt_p50, ipopt_p95), (rti_p50, rti_p95) = latency[scenario, 'ipopt'], latency[scenario, 'rti']
+        verdict = "lower" if rti_p50 < ipopt_p50 and rti_p95 < ipopt_p95 else "NOT lower"
+        print(f"Scenario {scenario}: RTI latency is {verdict} than IPOPT "
+              f"(p50 {ipopt_p50 / rti_p50:.1f}x, p95 {ipopt_p95 / rti_p95:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
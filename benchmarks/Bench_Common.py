@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+# The benchmark scripts import the simulator modules from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from Simulation import Simulation
+from Sweep import summarize
+
+
+def run_scenario(scenario_num, sim_time, mpc=None, setup=None, **sim_kwargs):
+    """
+    Construct a simulation of scenario_num, run it without plots or log files and return
+    (sim, Sweep.summarize metrics). mpc replaces the default controller (its dt is the control
+    period), then setup(sim) may change the traffic or prepare the controller outside the
+    timed run. sim_kwargs go to Simulation (e.g. mpc_kwargs), with dt=0.2 and barrier
+    logging off by default.
+    """
+    sim_kwargs = {'dt': 0.2 if mpc is None else mpc.dt, 'log_barriers': False, **sim_kwargs}
+    sim = Simulation(sim_time=sim_time, scenario_num=scenario_num, **sim_kwargs)
+    if mpc is not None:
+        sim.mpc = mpc
+    if setup is not None:
+        setup(sim)
+
+    start = time.perf_counter()
+    sim.run(visualize=False, log_dir=None, verbose=False)
+    return sim, summarize(sim, time.perf_counter() - start)
@@ -0,0 +1,53 @@
+import argparse
+import numpy as np
+
+from Bench_Common import run_scenario
+
+
+def run_budget(scenario_num, time_budget, backend, sim_time):
+    """Run one closed-loop simulation and return (solve times, MPC counters, final ego x)"""
+    sim, _ = run_scenario(scenario_num, sim_time, mpc_kwargs={'backend': backend, 'time_budget': time_budget})
+    return np.array(sim.solve_time_history), sim.mpc.counters, sim.ego_vehicle.state[0]
+
+
+def main():
+    """
+    Solve the scenarios without and with each time budget and report which budgets are
+    realistic. With IPOPT at N_p=20, 20 ms (about the unbudgeted p95) converges on almost
+    every step and 10 ms (about the median) still never brakes, with up to two thirds of the
+    steps on a feasible iterate. At 5 ms and below, plans expire and scenario 3 ends in
+    emergency braking. Those budgets are below what a full NLP solve needs: use the RTI
+    backend, whose single QP takes a few milliseconds.
+    """
+    parser = argparse.ArgumentParser(description="Deadline misses and fallback usage of the MPC under per-step time budgets")
+    parser.add_argument('--sim-time', type=float, default=30.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--budgets-ms', type=float, nargs='+', default=[20.0, 10.0, 5.0])
+    parser.add_argument('--backend', default='ipopt', choices=['ipopt', 'sqp', 'rti'])
+    args = parser.parse_args()
+
+    budgets = [None] + [1e-3 * budget for budget in args.budgets_ms]
+    realistic = {}
+    print(f"\n{'scenario':>8} {'budget':>7} {'p99 ms':>7} {'misses':>7} {'solved':>7} {'iterate':>8} "
+          f"{'shifted':>8} {'brake':>6} {'final x':>8}")
+    for scenario in args.scenarios:
+        for budget in budgets:
+            solve_time, counters, final_x = run_budget(scenario, budget, args.backend, args.sim_time)
+            label = 'none' if budget is None else f"{1e3 * budget:g}ms"
+            print(f"{scenario:>8} {label:>7} {1e3 * np.percentile(solve_time, 99):>7.1f} "
+                  f"{counters['deadline_misses']:>7} {counters['solved']:>7} {counters['feasible_iterate']:>8} "
+                  f"{counters['shifted_plan']:>8} {counters['emergency_brake']:>6} {final_x:>8.1f}")
+            # A budget is realistic when it never brakes, at most 10% of the steps need a plan
+            # shift and the slowest 1% of the steps overrun it by at most half
+            if budget is not None:
+                ok = (counters['emergency_brake'] == 0 and counters['shifted_plan'] <= 0.1 * len(solve_time)
+                      and np.percentile(solve_time, 99) <= 1.5 * budget)
+                realistic[label] = realistic.get(label, True) and ok
+
+    print(f"\nRealistic budgets for the {args.backend} backend (in every scenario no emergency braking, "
+          f"at most 10% shifted plans, p99 within 1.5x the budget): "
+          f"{', '.join(label for label, ok in realistic.items() if ok) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+import numpy as np
+
+from Bench_Common import run_scenario
+from Mpc_Controller import MPC
+from Explicit_Mpc import ExplicitMPC, build_table
+from Profiler import Profiler
+
+
+def run_policy(scenario_num, mpc, sim_time):
+    """Run one closed-loop simulation with the given controller; returns (summary metrics, profiler, ego y)"""
+    sim, metrics = run_scenario(scenario_num, sim_time, mpc=mpc, profiler=Profiler())
+    return metrics, sim.profiler, np.array(sim.ego_y_history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the explicit-MPC table policy against the online NLP")
+    parser.add_argument('--table', default='mpc_table', help="Table directory (built with --grid if missing)")
+    parser.add_argument('--grid', default='coarse', help="Grid used when the table has to be built")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for building the table")
+    parser.add_argument('--max-error', type=float, default=0.1, help="Largest accepted interpolation error [m/s²]")
+    parser.add_argument('--sim-time', type=float, default=20.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.table, 'meta.json')):
+        meta = build_table(args.table, grid=args.grid, workers=args.workers)
+        print(f"Built {args.table} in {meta['build_time']:.1f}s")
+    with open(os.path.join(args.table, 'meta.json')) as f:
+        config = json.load(f)['config']
+
+    print(f"\n{'scenario':>8} {'NLP ms':>8} {'table ms':>9} {'lookup us':>10} {'lookups':>8} {'max |dy|':>9} {'collision':>10}")
+    for scenario in args.scenarios:
+        # Online NLP with the configuration the table was computed for
+        mpc = MPC(dt=config['dt'], N_p=config['N_p'], N_c=config['N_c'], obstacle_range=config['obstacle_range'],
+                  num_obstacle_slots=config['num_obstacle_slots'])
+        nlp, nlp_profiler, y_nlp = run_policy(scenario, mpc, args.sim_time)
+        policy = ExplicitMPC(args.table, max_error=args.max_error)
+        table, table_profiler, y_table = run_policy(scenario, policy, args.sim_time)
+
+        lookup = table_profiler.durations('table_lookup')
+        share = policy.counters['table_lookups'] / max(len(lookup), 1)
+        print(f"{scenario:>8} {1e3 * np.mean(nlp_profiler.durations('mpc_solve')):>8.2f} "
+              f"{1e3 * np.mean(table_profiler.durations('mpc_solve')):>9.2f} {1e6 * np.median(lookup):>10.1f} "
+              f"{100 * share:>7.0f}% {np.max(np.abs(y_table - y_nlp)):>9.3f} "
+              f"{nlp['collision']:>4.0f} / {table['collision']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import numpy as np
+
+from Bench_Common import run_scenario
+
+
+def run_latency(scenario_num, latency, sim_time):
+    """Run one closed-loop simulation with the given controller latency and return its safety metrics"""
+    sim, metrics = run_scenario(scenario_num, sim_time, control_latency=latency)
+    ego_y = np.array(sim.ego_y_history)
+    metrics['max_road_excess'] = max(0.0, ego_y.max() - sim.environment.y_max, sim.environment.y_min - ego_y.min())
+    metrics['mean_delay'] = float(np.mean(sim.logger.get('command_delay')))
+    return metrics
+
+
+def parse_latency(value):
+    """'sync', 'measured' or a latency in seconds"""
+    if value == 'sync':
+        return None
+    return value if value == 'measured' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop safety of the MPC against controller latency")
+    parser.add_argument('--sim-time', type=float, default=30.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--latencies', nargs='+', default=['sync', 'measured', '0.2', '0.4', '0.6', '1.0'],
+                        help="'sync', 'measured' or a latency in seconds")
+    args = parser.parse_args()
+
+    print(f"\n{'scenario':>8} {'latency':>9} {'delay ms':>9} {'collision':>10} {'min gap':>8} "
+          f"{'road excess':>12} {'max jerk':>9}")
+    for scenario in args.scenarios:
+        for latency in args.latencies:
+            m = run_latency(scenario, parse_latency(latency), args.sim_time)
+            print(f"{scenario:>8} {latency:>9} {1e3 * m['mean_delay']:>9.0f} {m['collision']:>10.0f} "
+                  f"{m['min_gap']:>8.2f} {m['max_road_excess']:>12.2f} {m['max_jerk']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
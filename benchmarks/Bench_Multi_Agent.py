@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+import numpy as np
+
+import Bench_Common  # Puts src/ on the import path
+from Multi_Agent import MultiAgentSimulation, Agent
+from Vehicle_Dynamics import TrafficState
+from Env import Environment
+
+
+def build(num_agents, sim_time, workers, seed):
+    """num_agents MPC agents in the right lane, 60 m apart, with random initial and desired speeds"""
+    rng = np.random.default_rng(seed)
+    environment = Environment()
+    states = np.zeros((6, num_agents))
+    states[0] = 60.0 * np.arange(num_agents)
+    states[1] = environment.lane_centers[0]
+    states[2] = rng.uniform(20, 32, num_agents)
+    world = TrafficState(states, ids=['ego'] + [f'agent{k}' for k in range(1, num_agents)])
+    agents = [Agent(environment.get_lane_center(lane_idx=0), v_des) for v_des in rng.uniform(24, 34, num_agents)]
+    return MultiAgentSimulation(world, agents, sim_time=sim_time, environment=environment, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of synchronous multi-agent MPC steps against the number of threads")
+    parser.add_argument('--agents', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--sim-time', type=float, default=6.0, help="Simulated seconds per run")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    reference = None
+    for workers in args.workers:
+        sim = build(args.agents, args.sim_time, workers, args.seed)
+        start = time.perf_counter()
+        sim.run(verbose=False)
+        elapsed = time.perf_counter() - start
+        history = sim.world.history.copy()
+        if reference is None:
+            reference = history
+        rows.append((workers, elapsed, len(sim.time_history), np.array_equal(history, reference)))
+
+    print(f"\n{'workers':>7} {'ms/step':>8} {'solves/s':>9} {'speedup':>8} {'identical':>10}  ({os.cpu_count()} CPUs)")
+    for workers, elapsed, steps, identical in rows:
+        print(f"{workers:>7} {1e3 * elapsed / steps:>8.1f} {args.agents * steps / elapsed:>9.1f} "
+              f"{rows[0][1] / elapsed:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import argparse
+
+from Bench_Common import run_scenario
+
+
+def run_rate(scenario_num, control_dt, plant_dt, sim_time):
+    """Run one closed-loop simulation and return (number of solves, summary metrics)"""
+    sim, metrics = run_scenario(scenario_num, sim_time, dt=control_dt, plant_dt=plant_dt)
+    return len(sim.solve_time_history), metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trade MPC solves per simulated second against safety with a fixed plant step")
+    parser.add_argument('--sim-time', type=float, default=30.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--control-dts', type=float, nargs='+', default=[0.1, 0.2, 0.4])
+    parser.add_argument('--plant-dt', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"\n{'scenario':>8} {'control dt':>10} {'solves/s':>9} {'wall s':>7} {'collision':>10} {'min gap':>8} {'max jerk':>9}")
+    for scenario in args.scenarios:
+        for control_dt in args.control_dts:
+            solves, m = run_rate(scenario, control_dt, args.plant_dt, args.sim_time)
+            print(f"{scenario:>8} {control_dt:>10.2f} {solves / args.sim_time:>9.1f} {m['wall_time']:>7.2f} "
+                  f"{m['collision']:>10.0f} {m['min_gap']:>8.2f} {m['max_jerk']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
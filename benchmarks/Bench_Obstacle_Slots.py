@@ -0,0 +1,56 @@
+import argparse
+import time
+import numpy as np
+
+from Bench_Common import run_scenario
+from Vehicle_Dynamics import TrafficState
+
+
+def populate(sim, num_vehicles, rng):
+    """Add background vehicles behind and far ahead of the scenario vehicles up to num_vehicles in total"""
+    states = sim.traffic.states
+    extra = num_vehicles - states.shape[1]
+    if extra > 0:
+        new = np.zeros((6, extra))
+        new[0] = rng.choice([-1, 1], extra) * rng.uniform(300, 2000, extra)
+        new[1] = rng.choice(sim.environment.lane_centers, extra)
+        new[2] = rng.uniform(20, 35, extra)
+        states = np.hstack([states, new])
+    sim.set_traffic(TrafficState(states, ids=sim.traffic.ids + [f'bg{k}' for k in range(max(extra, 0))]))
+
+
+def run(num_vehicles, num_slots, sim_time, seed):
+    """Run scenario 1 with num_vehicles vehicles and return per-step solve times"""
+    setup = []
+
+    def build(sim):
+        populate(sim, num_vehicles, np.random.default_rng(seed))
+        start = time.perf_counter()
+        sim.mpc.get_problem(num_slots if num_slots is not None else num_vehicles)
+        setup.append(time.perf_counter() - start)
+
+    sim, _ = run_scenario(1, sim_time, setup=build, mpc_kwargs={'num_obstacle_slots': num_slots})
+    return setup[0], np.array(sim.solve_time_history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve time with one obstacle per vehicle against a fixed obstacle slot pool")
+    parser.add_argument('--sim-time', type=float, default=6.0, help="Simulated seconds per run")
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[2, 10, 25, 50])
+    parser.add_argument('--slots', type=int, default=4, help="Number of obstacle slots")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.vehicles:
+        rows.append((n, run(n, None, args.sim_time, args.seed), run(n, args.slots, args.sim_time, args.seed)))
+
+    print(f"\n{'vehicles':>8} {'all: setup s':>13} {'all: p50 ms':>12} {'all: p95 ms':>12} "
+          f"{'slots: setup s':>15} {'slots: p50 ms':>14} {'slots: p95 ms':>14}")
+    for n, (setup_all, t_all), (setup_slots, t_slots) in rows:
+        print(f"{n:>8} {setup_all:>13.3f} {1e3 * np.percentile(t_all, 50):>12.1f} {1e3 * np.percentile(t_all, 95):>12.1f} "
+              f"{setup_slots:>15.3f} {1e3 * np.percentile(t_slots, 50):>14.1f} {1e3 * np.percentile(t_slots, 95):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
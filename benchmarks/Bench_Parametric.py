@@ -0,0 +1,32 @@
+import argparse
+import numpy as np
+
+from Bench_Common import run_scenario
+
+
+def run_formulation(scenario_num, parametric, sim_time):
+    """Run one closed-loop simulation and return (wall time, number of steps, ego y history)"""
+    sim, metrics = run_scenario(scenario_num, sim_time, mpc_kwargs={'parametric': parametric})
+    return metrics['wall_time'], len(sim.time_history), np.array(sim.ego_y_history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rebuild-every-step MPC against the build-once parametric MPC")
+    parser.add_argument('--sim-time', type=float, default=10.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    args = parser.parse_args()
+
+    rows = []
+    for scenario in args.scenarios:
+        t_rebuild, steps, y_rebuild = run_formulation(scenario, False, args.sim_time)
+        t_param, _, y_param = run_formulation(scenario, True, args.sim_time)
+        rows.append((scenario, steps, t_rebuild, t_param, np.max(np.abs(y_rebuild - y_param))))
+
+    print(f"\n{'scenario':>8} {'steps':>6} {'rebuild ms/step':>16} {'parametric ms/step':>19} {'speedup':>8} {'max |dy|':>10}")
+    for scenario, steps, t_rebuild, t_param, dy in rows:
+        print(f"{scenario:>8} {steps:>6} {1e3 * t_rebuild / steps:>16.1f} {1e3 * t_param / steps:>19.1f} "
+              f"{t_rebuild / t_param:>7.1f}x {dy:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
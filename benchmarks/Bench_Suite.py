@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import casadi as ca
+from Bench_Common import run_scenario
+from Mpc_Controller import MPC
+from Profiler import Profiler
+from Vehicle_Dynamics import TrafficState
+
+# Solver configurations of the 'options' group (MPC keyword arguments)
+OPTIONS = {
+    'default': {},
+    'cold_start': {'warm_start': False},
+    'codegen_miss': {'codegen': True},
+    'codegen_hit': {'codegen': True},
+    'slots4': {'num_obstacle_slots': 4},
+    'sqp': {'backend': 'sqp'},
+    'rti': {'backend': 'rti'},
+}
+
+# Options measured against a codegen cache primed by an unmeasured run (the others start from an empty one)
+PRIMED = {'codegen_hit'}
+
+# Absolute changes below these are treated as noise by compare, by metric unit suffix
+NOISE_FLOOR = {'_ms': 0.5, '_s': 0.01, '_mb': 2.0}
+
+
+def build_cases(groups):
+    """Benchmark cases: the default configuration (scenario 1, N_p=20, scenario vehicles) varied one group at a time"""
+    sweeps = {
+        'horizon': ('N_p', [10, 20, 50, 100]),
+        'obstacles': ('obstacles', [0, 10, 25, 50]),
+        'scenarios': ('scenario', [1, 2, 3]),
+        'options': ('options', list(OPTIONS)),
+    }
+    cases = {}
+    for group in groups:
+        field, values = sweeps[group]
+        for value in values:
+            case = {'scenario': 1, 'N_p': 20, 'obstacles': None, 'options': 'default', field: value}
+            cases[f'{field}={value}'] = case
+    return cases
+
+
+def set_obstacles(sim, num_vehicles, rng):
+    """Keep the first scenario vehicles and add background traffic ahead and behind up to num_vehicles"""
+    states = sim.traffic.states[:, :num_vehicles]
+    ids = sim.traffic.ids[:num_vehicles]
+    extra = num_vehicles - states.shape[1]
+    if extra > 0:
+        new = np.zeros((6, extra))
+        new[0] = rng.choice([-1, 1], extra) * rng.uniform(300, 2000, extra)
+        new[1] = rng.choice(sim.environment.lane_centers, extra)
+        new[2] = rng.uniform(20, 35, extra)
+        states = np.hstack([states, new])
+        ids = ids + [f'bg{k}' for k in range(extra)]
+    sim.set_traffic(TrafficState(states.copy(), ids=ids))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process [MB]"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(case, sim_time, seed, cache_dir=None):
+    """
+    Run one case in a fresh worker process and return its metrics. Startup is the time from
+    constructing the MPC to the end of the first solve (problem build or codegen included).
+    The codegen cache is cache_dir, or an empty temporary directory.
+    """
+    rss_start = peak_rss_mb()
+
+    def obstacles(sim):
+        if case['obstacles'] is not None:
+            set_obstacles(sim, case['obstacles'], np.random.default_rng(seed))
+
+    with tempfile.TemporaryDirectory() as empty_dir:
+        start = time.perf_counter()
+        mpc = MPC(dt=0.2, N_p=case['N_p'], cache_dir=cache_dir if cache_dir else empty_dir,
+                  **OPTIONS[case['options']])
+        construct = time.perf_counter() - start
+        sim, metrics = run_scenario(case['scenario'], sim_time, mpc=mpc, setup=obstacles, profiler=Profiler())
+
+    solve = sim.profiler.durations('mpc_solve')
+    return {
+        'startup_s': construct + solve[0],
+        'solve_p50_ms': 1e3 * np.percentile(solve[1:], 50),
+        'solve_p95_ms': 1e3 * np.percentile(solve[1:], 95),
+        'solve_p99_ms': 1e3 * np.percentile(solve[1:], 99),
+        'mean_iter': float(np.mean(sim.mpc.iter_counts)),
+        'run_wall_s': metrics['wall_time'],
+        'peak_rss_mb': peak_rss_mb() - rss_start,
+    }
+
+
+def run_isolated(case, sim_time, seed, cache_dir=None):
+    """Run one case in its own single-use worker process, so no state carries over between cases"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_case, case, sim_time, seed, cache_dir).result()
+
+
+def run_primed(primer, case, sim_time, seed, cache_dir):
+    """Run one case with the codegen cache filled by the primer run (its errors are raised here)"""
+    primer.result()
+    return run_isolated(case, sim_time, seed, cache_dir)
+
+
+def write_results(path, baseline):
+    """Write the results JSON next to the target and rename it, so a partial suite leaves a valid file"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_suite(args):
+    """
+    Run the selected groups (one fresh process per run) and write the results as a JSON baseline.
+    The file is rewritten after every case; a case whose runs raise is recorded as failed.
+    codegen_miss measures compiling the solver, codegen_hit loading it from a primed cache.
+    """
+    cases = build_cases(args.groups)
+    baseline = {
+        'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform': platform.platform(),
+                 'processor': platform.processor(), 'python': platform.python_version(),
+                 'casadi': ca.__version__, 'numpy': np.__version__, 'sim_time': args.sim_time,
+                 'repeats': args.repeats, 'seed': args.seed},
+        'results': {},
+    }
+    results = baseline['results']
+    with ThreadPoolExecutor(max_workers=args.workers) as pool, tempfile.TemporaryDirectory() as cache_dir:
+        # Compile the libraries of the primed cases once; their measured runs then load them
+        primed = {name for name, case in cases.items() if case['options'] in PRIMED}
+        primers = {name: pool.submit(run_isolated, cases[name], args.sim_time, args.seed, cache_dir)
+                   for name in primed}
+        futures = {name: [pool.submit(run_primed, primers[name], case, args.sim_time, args.seed, cache_dir)
+                          if name in primed else pool.submit(run_isolated, case, args.sim_time, args.seed)
+                          for _ in range(args.repeats)]
+                   for name, case in cases.items()}
+        for name, repeats in futures.items():
+            try:
+                runs = [future.result() for future in repeats]
+            except Exception as e:
+                results[name] = {'case': cases[name], 'failed': True, 'error': f"{type(e).__name__}: {e}"}
+                print(f"{name:<20} FAILED: {results[name]['error']}")
+            else:
+                # Median over repeats for every metric
+                results[name] = {'case': cases[name],
+                                 **{metric: float(np.median([run[metric] for run in runs])) for metric in runs[0]}}
+                metrics = results[name]
+                print(f"{name:<20} startup {metrics['startup_s']:7.3f} s  p50 {metrics['solve_p50_ms']:7.2f} ms  "
+                      f"p95 {metrics['solve_p95_ms']:7.2f} ms  run {metrics['run_wall_s']:7.2f} s  "
+                      f"rss +{metrics['peak_rss_mb']:6.1f} MB")
+            write_results(args.out, baseline)
+
+    failed = sum(bool(metrics.get('failed')) for metrics in results.values())
+    print(f"Results written to {args.out}" + (f" ({failed} failed case(s))" if failed else ""))
+
+
+def compare(args):
+    """Compare two result files; exits with status 1 if any metric regressed beyond the threshold"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'case':<20} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in baseline:
+        if name not in current:
+            print(f"{name:<20} missing from {args.current}")
+            continue
+        if baseline[name].get('failed') or current[name].get('failed'):
+            print(f"{name:<20} failed in {args.baseline if baseline[name].get('failed') else args.current}")
+            continue
+        for metric, old in baseline[name].items():
+            if metric == 'case' or metric not in current[name]:
+                continue
+            new = current[name][metric]
+            change = (new - old) / old if old else 0.0
+            floor = next((value for suffix, value in NOISE_FLOOR.items() if metric.endswith(suffix)), 0.0)
+            # All metrics are lower-is-better
+            regressed = change > args.threshold and new - old > floor
+            regressions += regressed
+            if regressed or args.verbose:
+                flag = '  REGRESSION' if regressed else ''
+                print(f"{name:<20} {metric:<14} {old:>10.3f} {new:>10.3f} {100 * change:>+7.1f}%{flag}")
+
+    print(f"{regressions} regression(s) beyond {100 * args.threshold:.0f}%")
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MPC latency, startup, memory and run time benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the suite and write a JSON baseline")
+    run_parser.add_argument('--out', default=os.path.join('benchmarks', 'baselines', 'current.json'))
+    run_parser.add_argument('--groups', nargs='+', default=['horizon', 'obstacles', 'scenarios', 'options'],
+                            choices=['horizon', 'obstacles', 'scenarios', 'options'])
+    run_parser.add_argument('--sim-time', type=float, default=10.0, help="Simulated seconds per case")
+    run_parser.add_argument('--repeats', type=int, default=1, help="Runs per case (median is stored)")
+    run_parser.add_argument('--workers', type=int, default=1, help="Cases run in parallel (1 for stable timings)")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.set_defaults(func=run_suite)
+
+    compare_parser = commands.add_parser('compare', help="Flag regressions of a result file against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative slowdown")
+    compare_parser.add_argument('--verbose', action='store_true', help="Print every metric, not only regressions")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import numpy as np
+
+from Bench_Common import run_scenario
+
+
+def run_warm_start(scenario_num, warm_start, sim_time):
+    """Run one closed-loop simulation and return (wall time, IPOPT iteration counts, ego y history)"""
+    sim, metrics = run_scenario(scenario_num, sim_time, mpc_kwargs={'warm_start': warm_start})
+    return metrics['wall_time'], np.array(sim.mpc.iter_counts), np.array(sim.ego_y_history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold-started and warm-started MPC solves")
+    parser.add_argument('--sim-time', type=float, default=30.0, help="Simulated seconds per scenario")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2, 3])
+    args = parser.parse_args()
+
+    rows = []
+    for scenario in args.scenarios:
+        t_cold, iters_cold, y_cold = run_warm_start(scenario, False, args.sim_time)
+        t_warm, iters_warm, y_warm = run_warm_start(scenario, True, args.sim_time)
+        rows.append((scenario, len(y_cold), t_cold, t_warm, iters_cold, iters_warm,
+                     np.max(np.abs(y_cold - y_warm))))
+
+    print(f"\n{'scenario':>8} {'steps':>6} {'cold iters':>11} {'warm iters':>11} "
+          f"{'cold ms/step':>13} {'warm ms/step':>13} {'max |dy|':>10}")
+    for scenario, steps, t_cold, t_warm, iters_cold, iters_warm, dy in rows:
+        print(f"{scenario:>8} {steps:>6} {iters_cold.mean():>11.1f} {iters_warm.mean():>11.1f} "
+              f"{1e3 * t_cold / steps:>13.1f} {1e3 * t_warm / steps:>13.1f} {dy:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import numpy as np
+
+from Logger import load_log
+
+# Logged signals the analytics need
+ANALYSIS_SIGNALS = ['time', 'ego_x', 'ego_y', 'ego_vx', 'ego_ax', 'ego_ay', 'vehicles']
+DEFAULT_SIZE = (1.0, 0.5)  # Vehicle length and width [m] for logs written without sizes
+DEFAULT_ROAD = (0.0, 3.0)  # Environment road bounds [m] for logs written without them
+
+def load_run(log_dir):
+    """Analytics input of one logged run (memory-mapped signals, sizes and road bounds)"""
+    data = load_log(log_dir, signals=ANALYSIS_SIGNALS)
+    num_vehicles = data['vehicles'].shape[1]
+    if data['ego_size'] is None:
+        data['ego_size'] = np.array(DEFAULT_SIZE)
+    if data['vehicle_sizes'] is None:
+        data['vehicle_sizes'] = np.tile(DEFAULT_SIZE, (num_vehicles, 1))
+    data['vehicle_sizes'] = data['vehicle_sizes'].reshape(num_vehicles, 2)
+    if data['road'] is None:
+        data['road'] = np.array(DEFAULT_ROAD)
+    return data
+
+def simulation_data(sim):
+    """Analytics input of a finished Simulation, read from its logger without a log directory"""
+    data = {name: sim.logger.get(name) for name in ANALYSIS_SIGNALS}
+    data['ego_size'] = np.array([sim.ego_vehicle.length, sim.ego_vehicle.width])
+    data['vehicle_sizes'] = np.column_stack([sim.traffic.length, sim.traffic.width])
+    data['road'] = np.array([sim.environment.y_min, sim.environment.y_max])
+    return data
+
+def load_batch(log_dirs):
+    """
+    Stack the logs of several runs into arrays with a leading run axis. Shorter runs are
+    padded with NaN steps and runs with fewer vehicles with NaN vehicles; neither counts
+    in the metrics.
+    """
+    runs = [load_run(log_dir) for log_dir in log_dirs]
+    num_runs = len(runs)
+    num_steps = max(len(run['time']) for run in runs)
+    num_vehicles = max(run['vehicles'].shape[1] for run in runs)
+
+    batch = {name: np.full((num_runs, num_steps), np.nan) for name in ANALYSIS_SIGNALS if name != 'vehicles'}
+    batch['vehicles'] = np.full((num_runs, num_steps, num_vehicles, 6), np.nan)
+    batch['vehicle_sizes'] = np.full((num_runs, num_vehicles, 2), np.nan)
+    batch['ego_size'] = np.array([run['ego_size'] for run in runs])
+    batch['road'] = np.array([run['road'] for run in runs])
+    for k, run in enumerate(runs):
+        steps, vehicles = run['vehicles'].shape[:2]
+        for name in ANALYSIS_SIGNALS:
+            if name != 'vehicles':
+                batch[name][k, :steps] = run[name]
+        batch['vehicles'][k, :steps, :vehicles] = run['vehicles']
+        batch['vehicle_sizes'][k, :vehicles] = run['vehicle_sizes']
+    return batch
+
+def step_metrics(data):
+    """
+    Per-step metrics against every vehicle, arrays of shape (..., steps, vehicles):
+    'gap': clearance between the ego and vehicle boxes [m] (0 when they overlap),
+    'clearance': signed clearance [m], the gap or minus the overlap depth of colliding boxes,
+    'ttc': time to collision [s] of closing vehicles in the ego's path, ahead or behind (inf otherwise),
+    'headway': time headway [s] to vehicles ahead in the ego's path (inf otherwise),
+    'collision': whether the boxes overlap.
+    A vehicle is in the ego's path when the boxes overlap laterally.
+    """
+    vehicles = data['vehicles']
+    ego_vx = data['ego_vx'][..., None]
+    delta_x = vehicles[..., 0] - data['ego_x'][..., None]
+    delta_y = vehicles[..., 1] - data['ego_y'][..., None]
+
+    # Free distance between the box edges along x and y (negative when they overlap)
+    sizes = data['vehicle_sizes'][..., None, :, :]
+    free_x = np.abs(delta_x) - (data['ego_size'][..., 0, None, None] + sizes[..., 0]) / 2
+    free_y = np.abs(delta_y) - (data['ego_size'][..., 1, None, None] + sizes[..., 1]) / 2
+
+    collision = (free_x < 0) & (free_y < 0)
+    gap = np.hypot(np.maximum(free_x, 0), np.maximum(free_y, 0))
+    gap[np.isnan(gap)] = np.inf
+    clearance = np.where(collision, np.maximum(free_x, free_y), gap)
+
+    # Closing speed is positive when the gap shrinks (ego catching up, or a vehicle behind catching up)
+    in_path = free_y < 0
+    closing = np.where(delta_x >= 0, ego_vx - vehicles[..., 2], vehicles[..., 2] - ego_vx)
+    ttc = np.full(delta_x.shape, np.inf)
+    np.divide(np.maximum(free_x, 0), closing, out=ttc, where=in_path & (closing > 0))
+
+    headway = np.full(delta_x.shape, np.inf)
+    np.divide(np.maximum(free_x, 0), np.broadcast_to(ego_vx, delta_x.shape), out=headway,
+              where=in_path & (delta_x > 0) & (ego_vx > 0))
+
+    return {'gap': gap, 'clearance': clearance, 'ttc': ttc, 'headway': headway, 'collision': collision}
+
+def run_metrics(data):
+    """
+    Per-run metrics of a single run (0-d arrays) or a batch (arrays of shape (runs,)):
+    minimum gap, TTC and headway, first collision time (NaN without collision), jerk and
+    acceleration comfort metrics, and lane-boundary violations of the ego box.
+    """
+    steps = step_metrics(data)
+    time = data['time']
+    valid = ~np.isnan(time)
+
+    # First step at which any pair of boxes overlaps
+    collision_step = steps['collision'].any(axis=-1)
+    collided = collision_step.any(axis=-1)
+    first = np.argmax(collision_step, axis=-1)
+    first_collision = np.where(collided, np.take_along_axis(time, first[..., None], axis=-1)[..., 0], np.nan)
+
+    # Comfort: jerk from the logged accelerations
+    jerk_x = np.diff(data['ego_ax'], axis=-1) / np.diff(time, axis=-1)
+    jerk_y = np.diff(data['ego_ay'], axis=-1) / np.diff(time, axis=-1)
+    jerk = np.hypot(jerk_x, jerk_y)
+    num_jerk = np.count_nonzero(~np.isnan(jerk), axis=-1)
+    rms_jerk = np.sqrt(np.nansum(jerk ** 2, axis=-1) / np.maximum(num_jerk, 1))
+
+    # Lane-boundary violations: how far the ego box reaches beyond the road edges
+    half_width = data['ego_size'][..., 1, None] / 2
+    road = data['road']
+    excursion = np.maximum(np.maximum(road[..., 0, None] - (data['ego_y'] - half_width),
+                                      (data['ego_y'] + half_width) - road[..., 1, None]), 0)
+    violation = excursion > 0
+    num_steps = np.count_nonzero(valid, axis=-1)
+
+    return {
+        'collision': collided.astype(np.float64),
+        'first_collision_time': first_collision,
+        'min_gap': np.min(steps['gap'], axis=(-2, -1), initial=np.inf),
+        'min_ttc': np.min(steps['ttc'], axis=(-2, -1), initial=np.inf),
+        'min_headway': np.min(steps['headway'], axis=(-2, -1), initial=np.inf),
+        'max_jerk': np.fmax.reduce(jerk, axis=-1, initial=0.0),
+        'rms_jerk': rms_jerk,
+        'max_accel': np.fmax.reduce(np.hypot(data['ego_ax'], data['ego_ay']), axis=-1, initial=0.0),
+        'lane_violation_steps': np.count_nonzero(violation, axis=-1).astype(np.float64),
+        'lane_violation_fraction': np.count_nonzero(violation, axis=-1) / np.maximum(num_steps, 1),
+        'max_lane_excursion': np.fmax.reduce(excursion, axis=-1, initial=0.0),
+    }
+
+def rank(metrics, by, descending=False):
+    """Run indices ordered by one metric (ascending unless descending); NaN values come last"""
+    values = np.atleast_1d(metrics[by])
+    return np.argsort(-values if descending else values, kind='stable').tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description="Safety and comfort metrics of logged simulation runs")
+    parser.add_argument('log_dirs', nargs='+', help="Log directories written by Simulation.run")
+    parser.add_argument('--sort', default='min_ttc', help="Metric to rank the runs by")
+    parser.add_argument('--descending', action='store_true')
+    parser.add_argument('--top', type=int, default=20, help="Number of runs to print")
+    args = parser.parse_args()
+
+    metrics = run_metrics(load_batch(args.log_dirs))
+    columns = ['collision', 'first_collision_time', 'min_gap', 'min_ttc', 'min_headway', 'max_jerk',
+               'rms_jerk', 'lane_violation_fraction']
+    print(f"{'run':<30} " + " ".join(f"{name[:12]:>12}" for name in columns))
+    for k in rank(metrics, args.sort, args.descending)[:args.top]:
+        print(f"{args.log_dirs[k][-30:]:<30} " + " ".join(f"{metrics[name][k]:>12.3f}" for name in columns))
+
+if __name__ == "__main__":
+    main()
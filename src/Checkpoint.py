@@ -0,0 +1,43 @@
+import json
+import os
+import numpy as np
+
+def save_checkpoint(path, snapshot):
+    """
+    Write a Simulation.checkpoint snapshot as a pickle-free .npz: the arrays become entries
+    and the nesting with the remaining (plain) values is stored as JSON. The file is written
+    next to the target and then renamed, so an interruption never leaves it truncated.
+    """
+    arrays = {}
+
+    def encode(value):
+        if isinstance(value, np.ndarray):
+            key = f'array{len(arrays)}'
+            arrays[key] = value
+            return {'__array__': key}
+        if isinstance(value, dict):
+            return {str(name): encode(item) for name, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    tree = json.dumps(encode(snapshot))
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, __tree__=np.array(tree), **arrays)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    """Read a snapshot written by save_checkpoint"""
+    with np.load(path) as data:
+        def decode(value):
+            if isinstance(value, dict):
+                if '__array__' in value:
+                    return data[value['__array__']]
+                return {name: decode(item) for name, item in value.items()}
+            if isinstance(value, list):
+                return [decode(item) for item in value]
+            return value
+
+        return decode(json.loads(str(data['__tree__'])))
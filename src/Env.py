@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 
 class Environment:
@@ -43,14 +44,17 @@ class Environment:
                 plt.gca().add_patch(vehicle_rect)
                 
                 # Draw vehicle trajectory
-                traj = np.array(vehicle.trajectory)
+                traj = np.asarray(vehicle.trajectory)
                 plt.plot(traj[:, 0], traj[:, 1], 'g-' if vehicle.id == 'ego' else 'b-', alpha=0.5)
         
-        # Draw safety barriers if provided
+        # Draw safety barriers if provided: {name: (x, y)}, one curve per row of 2D arrays
         if safety_barriers:
             for barrier_name, barrier_data in safety_barriers.items():
-                x_vals, y_vals = barrier_data
-                plt.plot(x_vals, y_vals, 'm-', linewidth=1, alpha=0.6)
+                x_vals, y_vals = np.broadcast_arrays(*(np.atleast_2d(values) for values in barrier_data))
+                # All curves of a vehicle are drawn as a single collection
+                plt.gca().add_collection(LineCollection(np.stack([x_vals, y_vals], axis=-1), colors='m',
+                                                        linewidths=1, alpha=0.6 / np.sqrt(len(x_vals))))
+            plt.gca().autoscale_view()
                 
         plt.grid(True)
         plt.xlabel('X [m]')
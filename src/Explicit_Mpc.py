@@ -0,0 +1,270 @@
+import argparse
+import bisect
+import json
+import operator
+import os
+import time
+import types
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Env import Environment
+from Mpc_Controller import MPC
+from Utils import SigmoidBarrier
+from Vehicle_Dynamics import TrafficState
+
+# MPC attributes the table was computed with; a lookup is only valid while they are unchanged
+TABLE_CONFIG = ('dt', 'N_p', 'N_c', 'obstacle_range', 'num_obstacle_slots', 'Q_lat', 'Q_vel', 'R_da_ex', 'R_da_ey', 'chi',
+                'a_ex_min', 'a_ex_max', 'a_ey_min', 'a_ey_max', 'da_ex_max', 'da_ey_max',
+                'y_min', 'y_max', 'vx_min', 'vx_max', 'beta_max')
+
+# (delta, eta) pairs produced by the FSM
+SIGNALS = [(0, 1), (1, 1), (-1, 1), (0, 0)]
+
+# Continuous table axes: ego vx, ego vy, ego y and longitudinal gap to the obstacle (obstacle x - ego x)
+AXES = ('vx', 'vy', 'y', 'gap')
+GRIDS = {
+    'default': {'vx': np.linspace(10, 40, 7), 'vy': np.linspace(0, 2, 5), 'y': np.linspace(0, 6, 9),
+                'gap': [-100, -60, -30, -15, -5, 0, 5, 15, 30, 45, 60, 80, 100]},
+    'coarse': {'vx': np.linspace(15, 35, 5), 'vy': [0, 0.5, 1.5], 'y': [0, 0.75, 1.5, 2.25, 3, 4.5, 6],
+               'gap': [-60, -20, 0, 20, 40, 70, 100]},
+}
+
+# One MPC per worker process, keyed by the table configuration
+_worker_mpcs = {}
+
+def default_settings():
+    """Per-call MPC inputs the table is computed for: the Simulation defaults"""
+    return {'y_ref': Environment().get_lane_center(lane_idx=0), 'v_des': 30.0, 'half_width': 0.25,
+            'y_lat': SigmoidBarrier().y_lat, 'TIV': 4.0, 'TTC': 2.0}
+
+def worker_mpc(config):
+    """Cold-started MPC of this worker with the table configuration"""
+    key = json.dumps(config, sort_keys=True)
+    if key not in _worker_mpcs:
+        mpc = MPC(dt=config['dt'], N_p=config['N_p'], N_c=config['N_c'], warm_start=False)
+        for name, value in config.items():
+            setattr(mpc, name, value)
+        _worker_mpcs[key] = mpc
+    return _worker_mpcs[key]
+
+def solve_points(config, settings, lane_y, signals, vx, vys, ys, gaps):
+    """
+    First control move at every (vy, y, gap) combination for one ego vx, obstacle lane and pair
+    of FSM signals (lane_y None: no obstacle). Returns (moves of shape (vy, y, gap, 2),
+    solved flags of shape (vy, y, gap)).
+    """
+    mpc = worker_mpc(config)
+    barrier = SigmoidBarrier(settings['y_lat'])
+    barrier.optimize_zeta(vx)
+    # With the signals given, the solve only reads TIV and TTC from the decision maker
+    decision_maker = types.SimpleNamespace(TIV=settings['TIV'], TTC=settings['TTC'])
+
+    moves = np.full((len(vys), len(ys), len(gaps), 2), np.nan)
+    solved = np.zeros(moves.shape[:3], dtype=bool)
+    for i, vy in enumerate(vys):
+        for j, y in enumerate(ys):
+            ego = TrafficState([0.0, y, vx, vy, 0.0, 0.0], width=2 * settings['half_width']).vehicles[0]
+            for k, gap in enumerate(gaps):
+                obstacles = [] if lane_y is None else TrafficState([gap, lane_y, 0.0, 0.0, 0.0, 0.0]).vehicles
+                num_solved = mpc.counters['solved']
+                moves[i, j, k] = mpc.solve(ego, obstacles, barrier, decision_maker, settings['y_ref'],
+                                           settings['v_des'], signals=signals)[:2]
+                solved[i, j, k] = mpc.counters['solved'] > num_solved
+    return moves, solved
+
+def cell_mean(values, first_axis):
+    """Mean over the 2^4 corners of every grid cell along the four axes starting at first_axis"""
+    for axis in range(first_axis, first_axis + len(AXES)):
+        n = values.shape[axis]
+        values = (values.take(range(n - 1), axis=axis) + values.take(range(1, n), axis=axis)) / 2
+    return values
+
+def build_table(out_dir, grid='default', workers=None, mpc_kwargs=None, settings=None, lane_centers=None):
+    """
+    Sample MPC.solve (cold started) over the grid on a process pool and store the first control move.
+
+    Files in out_dir, all plain .npy that can be memory-mapped:
+    table.npy, the moves of shape (signals, obstacle lanes + 1, vx, vy, y, gap, 2) in float32,
+    where the last obstacle lane entry is the case without an obstacle;
+    solved.npy, the grid points at which the NLP converged;
+    error.npy, per grid cell the difference between the NLP solution at the cell center and the
+    interpolated move (inf if any of these solves failed), used as the confidence of a lookup;
+    meta.json, the axes, the MPC configuration and the per-call settings.
+    """
+    grid = {name: [float(v) for v in values] for name, values in (GRIDS[grid] if isinstance(grid, str) else grid).items()}
+    centers = {name: [(a + b) / 2 for a, b in zip(values[:-1], values[1:])] for name, values in grid.items()}
+    settings = dict(default_settings(), **(settings or {}))
+    lane_centers = list(lane_centers) if lane_centers is not None else Environment().lane_centers
+    mpc = MPC(**dict({'obstacle_range': 100.0}, **(mpc_kwargs or {})))
+    config = {name: getattr(mpc, name) for name in TABLE_CONFIG}
+    num_lanes = len(lane_centers)
+
+    shape = (len(SIGNALS), num_lanes + 1) + tuple(len(grid[name]) for name in AXES)
+    os.makedirs(out_dir, exist_ok=True)
+    table = np.lib.format.open_memmap(os.path.join(out_dir, 'table.npy'), mode='w+', dtype=np.float32,
+                                      shape=shape + (2,))
+    solved = np.lib.format.open_memmap(os.path.join(out_dir, 'solved.npy'), mode='w+', dtype=bool, shape=shape)
+    center_shape = shape[:2] + tuple(n - 1 for n in shape[2:])
+    center_moves = np.full(center_shape + (2,), np.nan)
+    center_solved = np.zeros(center_shape, dtype=bool)
+
+    # One task per (points or centers, lane, signals, vx). Without an obstacle the move does not
+    # depend on the signals and the gap: it is solved once per vx and broadcast
+    tasks = {}
+    for kind, values in (('points', grid), ('centers', centers)):
+        for lane in range(num_lanes + 1):
+            for k in range(len(SIGNALS) if lane < num_lanes else 1):
+                for i, vx in enumerate(values['vx']):
+                    gaps = values['gap'] if lane < num_lanes else values['gap'][:1]
+                    lane_y = lane_centers[lane] if lane < num_lanes else None
+                    tasks[(kind, lane, k, i)] = (lane_y, SIGNALS[k], vx, values['vy'], values['y'], gaps)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solve_points, config, settings, *args): key for key, args in tasks.items()}
+        for future in as_completed(futures):
+            kind, lane, k, i = futures[future]
+            moves, ok = future.result()
+            signal_slice = k if lane < num_lanes else slice(None)
+            if kind == 'points':
+                table[signal_slice, lane, i], solved[signal_slice, lane, i] = moves, ok
+            else:
+                center_moves[signal_slice, lane, i], center_solved[signal_slice, lane, i] = moves, ok
+
+    # Multilinear interpolation at a cell center is the mean of the cell corners
+    error = np.max(np.abs(center_moves - cell_mean(table[:].astype(np.float64), 2)), axis=-1)
+    error[~(center_solved & (cell_mean(solved[:].astype(np.float64), 2) == 1))] = np.inf
+    np.save(os.path.join(out_dir, 'error.npy'), error.astype(np.float32))
+    table.flush()
+    solved.flush()
+
+    meta = {'axes': grid, 'signals': SIGNALS, 'lane_centers': lane_centers, 'settings': settings,
+            'config': config, 'zeta': [SigmoidBarrier(settings['y_lat']).optimize_zeta(vx) for vx in grid['vx']],
+            'build_time': time.perf_counter() - start}
+    tmp_path = os.path.join(out_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(out_dir, 'meta.json'))
+    return meta
+
+class ExplicitMPC(MPC):
+    def __init__(self, table_dir, max_error=0.1, lane_tol=0.25, zeta_tol=0.05, **mpc_kwargs):
+        """
+        MPC policy that interpolates the first control move from a table written by build_table.
+
+        A lookup is used when the configuration and per-call settings match the table, at most
+        one obstacle is selected and it is near one of the tabulated lanes, the state lies inside
+        the grid, and the interpolation error measured at the center of its grid cell is at most
+        max_error [m/s²]. Otherwise the online NLP of the MPC base class is solved.
+        """
+        with open(os.path.join(table_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        config = meta['config']
+        super().__init__(dt=config['dt'], N_p=config['N_p'], N_c=config['N_c'], **mpc_kwargs)
+        for name, value in config.items():
+            setattr(self, name, value)
+        self.get_config = operator.attrgetter(*TABLE_CONFIG)
+        self.table_config = tuple(config[name] for name in TABLE_CONFIG)
+        self.settings = tuple(meta['settings'][name] for name in default_settings())
+        self.table = np.load(os.path.join(table_dir, 'table.npy'), mmap_mode='r')
+        self.error = np.load(os.path.join(table_dir, 'error.npy'), mmap_mode='r')
+        self.axes = [meta['axes'][name] for name in AXES]
+        self.zeta_axis = meta['zeta']
+        self.lane_centers = meta['lane_centers']
+        self.signal_index = {tuple(pair): k for k, pair in enumerate(meta['signals'])}
+        self.max_error = max_error
+        self.lane_tol = lane_tol
+        self.zeta_tol = zeta_tol
+
+    def reset_counters(self):
+        """Clear the MPC counters and the table lookup/fallback counts"""
+        super().reset_counters()
+        self.counters['table_lookups'] = 0
+        self.counters['table_fallbacks'] = 0
+
+    def solve(self, ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker, y_ref, v_des, signals=None,
+              index=None):
+        """Same interface as MPC.solve: table lookup when it is covered, online NLP otherwise"""
+        if signals is None:
+            signals = decision_maker.determine_activation_signals(ego_vehicle, surrounding_vehicles)[:2]
+
+        with self.profiler.span('table_lookup', 'mpc'):
+            move = self.lookup(ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker,
+                               y_ref, v_des, signals, index)
+        if move is None:
+            self.counters['table_fallbacks'] += 1
+            return super().solve(ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker,
+                                 y_ref, v_des, signals=signals, index=index)
+
+        self.counters['table_lookups'] += 1
+        # A stored plan is outdated once a step was taken from the table
+        self.reset_warm_start()
+        return float(move[0]), float(move[1]), []
+
+    def lookup(self, ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker, y_ref, v_des, signals,
+               index=None):
+        """Interpolated (a_ex, a_ey) from the table, or None outside its coverage"""
+        k_signal = self.signal_index.get((int(signals[0]), int(signals[1])))
+        settings = (y_ref, v_des, ego_vehicle.width / 2, sigmoid_barrier.y_lat, decision_maker.TIV, decision_maker.TTC)
+        if k_signal is None or any(abs(a - b) > 1e-9 for a, b in zip(settings, self.settings)) or \
+                self.get_config(self) != self.table_config:
+            return None
+
+        state = ego_vehicle.state
+        obstacles = self.select_obstacles(ego_vehicle, surrounding_vehicles, index)
+        if len(obstacles) > 1:
+            return None
+        if obstacles:
+            obs_y = obstacles[0].state[1]
+            lane = min(range(len(self.lane_centers)), key=lambda j: abs(self.lane_centers[j] - obs_y))
+            if abs(self.lane_centers[lane] - obs_y) > self.lane_tol:
+                return None
+            gap = obstacles[0].state[0] - state[0]
+        else:
+            lane, gap = len(self.lane_centers), self.axes[3][0]  # Constant along the gap axis
+
+        # Enclosing grid cell and the interpolation weights along every axis
+        cell = [k_signal, lane]
+        weights = []
+        for axis, value in zip(self.axes, (state[2], state[3], state[1], gap)):
+            if not axis[0] <= value <= axis[-1]:
+                return None
+            i = min(bisect.bisect_right(axis, value), len(axis) - 1) - 1
+            cell.append(i)
+            weights.append((value - axis[i]) / (axis[i + 1] - axis[i]))
+
+        # The barrier steepness must follow the zeta schedule of the table
+        i_vx = cell[2]
+        zeta = self.zeta_axis[i_vx] + weights[0] * (self.zeta_axis[i_vx + 1] - self.zeta_axis[i_vx])
+        if abs(sigmoid_barrier.zeta - zeta) > self.zeta_tol * zeta:
+            return None
+
+        if not self.error[tuple(cell)] <= self.max_error:
+            return None
+        corners = np.array(self.table[tuple(cell[:2]) + tuple(slice(i, i + 2) for i in cell[2:])], dtype=np.float64)
+        for t in weights:
+            corners = corners[0] + t * (corners[1] - corners[0])
+        return corners
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the explicit-MPC lookup table offline")
+    parser.add_argument('--out', default='mpc_table')
+    parser.add_argument('--grid', default='default', choices=list(GRIDS))
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--obstacle-range', type=float, default=100.0,
+                        help="Obstacle range [m] of the MPC the table is built for")
+    parser.add_argument('--obstacle-slots', type=int, default=None,
+                        help="Obstacle slots of the MPC (1 makes every situation a single-obstacle lookup)")
+    args = parser.parse_args()
+
+    meta = build_table(args.out, grid=args.grid, workers=args.workers,
+                       mpc_kwargs={'obstacle_range': args.obstacle_range, 'num_obstacle_slots': args.obstacle_slots})
+    solved = np.load(os.path.join(args.out, 'solved.npy'), mmap_mode='r')
+    error = np.load(os.path.join(args.out, 'error.npy'), mmap_mode='r')
+    print(f"Table with {solved.size} grid points written to {args.out} in {meta['build_time']:.1f}s, "
+          f"{100 * solved.mean():.1f}% converged, interpolation error p50 {np.median(error):.3f}, "
+          f"p90 {np.percentile(error, 90):.3f} m/s²")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import math
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from Simulation import Simulation
+from Vehicle_Dynamics import TrafficState
+from Termination import Collision, ScenarioResolved
+from Analytics import simulation_data, step_metrics
+from Sweep import apply_parameters, worker_mpc, summarize, save_results
+
+# Search space of the scenario vehicles: '<vehicle id>_<field>' -> (low, high), as in Sweep.py
+SCENARIO_SPACE = {
+    'ego_vx': (20.0, 35.0),
+    'veh1_gap': (20.0, 200.0),
+    'veh1_vx': (0.0, 35.0),
+    'veh1_ax': (-6.0, 2.0),
+    'veh2_gap': (-50.0, 250.0),
+    'veh2_vx': (10.0, 40.0),
+    'veh2_ax': (-4.0, 2.0),
+}
+
+def generated_space(num_vehicles, y_range=(0.5, 2.5)):
+    """Search space of num_vehicles generated vehicles 'gen1'... (gap, lateral position, speed, acceleration)"""
+    space = {}
+    for k in range(1, num_vehicles + 1):
+        space.update({f'gen{k}_gap': (-100.0, 250.0), f'gen{k}_y': y_range,
+                      f'gen{k}_vx': (0.0, 40.0), f'gen{k}_ax': (-4.0, 2.0)})
+    return space
+
+def add_vehicles(sim, num_vehicles):
+    """Append num_vehicles vehicles 'gen1'... with zero states, to be placed by their parameters"""
+    states = np.hstack([sim.traffic.states, np.zeros((6, num_vehicles))])
+    ids = sim.traffic.ids + [f'gen{k}' for k in range(1, num_vehicles + 1)]
+    sim.set_traffic(TrafficState(states, length=np.append(sim.traffic.length, np.ones(num_vehicles)),
+                                 width=np.append(sim.traffic.width, np.full(num_vehicles, 0.5)), ids=ids))
+
+def robustness(data):
+    """
+    Signed safety margin of a run [m]: the smallest clearance between the ego box and any
+    vehicle box, or minus the deepest overlap once the boxes collided (0 at contact);
+    the minimum of Analytics.step_metrics' signed clearance
+    """
+    clearance = step_metrics(data)['clearance']
+    return float(clearance.min()) if clearance.size else np.inf
+
+def evaluate(run_id, params, scenario_num, num_generated, sim_kwargs, mpc_kwargs):
+    """Run one candidate until it collides, resolves or times out; returns its parameters and metrics"""
+    sim_kwargs = {'log_barriers': False, **sim_kwargs}
+    sim = Simulation(scenario_num=scenario_num, terminate_when=[Collision(), ScenarioResolved()], **sim_kwargs)
+    if num_generated:
+        add_vehicles(sim, num_generated)
+    sim.mpc = worker_mpc(params, sim.dt, mpc_kwargs)
+    apply_parameters(sim, params)
+
+    start = time.perf_counter()
+    sim.run(visualize=False, log_dir=None, verbose=False)
+    wall_time = time.perf_counter() - start
+
+    return {'run_id': run_id, **params, **summarize(sim, wall_time),
+            'robustness': robustness(simulation_data(sim))}
+
+def falsify(space, scenario_num=1, num_generated=0, iterations=10, population=32, elite_frac=0.2,
+            smoothing=0.7, min_std=0.02, threshold=0.0, target_failures=None, workers=None,
+            sim_kwargs=None, mpc_kwargs=None, seed=0, out=None, verbose=True):
+    """
+    Cross-entropy search for initial conditions that make the controller fail.
+
+    Every parameter of space = {name: (low, high)} is searched on [0, 1]. Each iteration
+    samples population candidates from a clipped Gaussian, evaluates them on a process pool
+    (runs end early once they collided or resolved) and moves the Gaussian towards the
+    elite_frac * population least robust candidates evaluated so far, with the given
+    smoothing. Keeping the elite across iterations stops the search from drifting away from
+    failures found early when a small population averages dissimilar elites. A candidate
+    fails when its robustness is at most threshold [m]. The search stops after iterations
+    or once target_failures failures were found.
+
+    Returns (corpus, evaluations): the failing candidates ranked by robustness (worst first)
+    and every evaluated candidate. The corpus is written to out as a columnar .npz.
+    """
+    names = sorted(space)
+    low = np.array([space[name][0] for name in names])
+    high = np.array([space[name][1] for name in names])
+    rng = np.random.default_rng(seed)
+    mean = np.full(len(names), 0.5)
+    std = np.full(len(names), 0.3)
+    num_elite = max(2, math.ceil(elite_frac * population))
+    sim_kwargs = dict(sim_kwargs or {})
+    mpc_kwargs = dict(mpc_kwargs or {})
+
+    evaluations = []
+    samples = np.empty((0, len(names)))  # Every evaluated candidate on [0, 1]
+    scores = np.empty(0)                 # and its robustness (inf if the run failed)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for iteration in range(iterations):
+            u = np.clip(mean + std * rng.standard_normal((population, len(names))), 0.0, 1.0)
+            candidates = [dict(zip(names, (low + u_k * (high - low)).tolist())) for u_k in u]
+            futures = [pool.submit(evaluate, len(evaluations) + k, params, scenario_num, num_generated,
+                                   sim_kwargs, mpc_kwargs) for k, params in enumerate(candidates)]
+            for k, future in enumerate(futures):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"Candidate {len(evaluations)} failed to run: {e}")
+                    row = {'run_id': len(evaluations), **candidates[k], 'robustness': np.nan}
+                row['iteration'] = iteration
+                evaluations.append(row)
+            samples = np.vstack([samples, u])
+            scores = np.array([row['robustness'] for row in evaluations])
+            scores[np.isnan(scores)] = np.inf
+
+            # Refit the sampling distribution to the least robust candidates
+            elite = samples[np.argsort(scores, kind='stable')[:num_elite]]
+            mean = smoothing * elite.mean(axis=0) + (1 - smoothing) * mean
+            std = np.maximum(smoothing * elite.std(axis=0) + (1 - smoothing) * std, min_std)
+
+            num_failures = sum(row['robustness'] <= threshold for row in evaluations)
+            if verbose:
+                print(f"Iteration {iteration}: best robustness {np.min(scores[-population:]):.3f} m, "
+                      f"{num_failures} failures in {len(evaluations)} runs")
+            if target_failures is not None and num_failures >= target_failures:
+                break
+
+    corpus = sorted((row for row in evaluations if row['robustness'] <= threshold),
+                    key=lambda row: row['robustness'])
+    if out is not None:
+        save_results(out, corpus)
+    return corpus, evaluations
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-entropy search for collision-inducing initial conditions")
+    parser.add_argument('--scenario', type=int, default=1, help="Base scenario of Scenarios.setup_scenario")
+    parser.add_argument('--generated', type=int, default=0,
+                        help="Search over this many generated vehicles instead of the scenario vehicles")
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--population', type=int, default=32, help="Candidates per iteration")
+    parser.add_argument('--target-failures', type=int, default=None, help="Stop once this many failures were found")
+    parser.add_argument('--threshold', type=float, default=0.0, help="Robustness [m] at or below which a run fails")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--sim-time', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='falsification_corpus.npz')
+    args = parser.parse_args()
+
+    if args.generated:
+        space = {'ego_vx': SCENARIO_SPACE['ego_vx'], **generated_space(args.generated)}
+    else:
+        space = SCENARIO_SPACE
+    corpus, evaluations = falsify(space, scenario_num=args.scenario, num_generated=args.generated,
+                                  iterations=args.iterations, population=args.population,
+                                  threshold=args.threshold, target_failures=args.target_failures,
+                                  workers=args.workers, sim_kwargs={'sim_time': args.sim_time},
+                                  seed=args.seed, out=args.out)
+
+    print(f"{len(corpus)} failing scenarios in {len(evaluations)} runs written to {args.out}")
+    for row in corpus[:10]:
+        print(f"robustness {row['robustness']:7.3f} m  " + "  ".join(f"{name}={row[name]:.2f}" for name in sorted(space)))
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import numpy as np
+
+from Profiler import Profiler
+
 class DecisionMaking:
     def __init__(self, TTC=2, TIV=4):
         """Initialize decision making with safety parameters"""
@@ -8,9 +12,14 @@ class DecisionMaking:
         self.eta = 1    # Braking activation (0 = brake, 1 = no brake)
         self.lane_change_progress = 0  # 0-100% completion
         self.abort_flag = False
+        self.profiler = Profiler(enabled=False)  # Replaced by the simulation's profiler when profiling
 
-    def determine_activation_signals(self, ego_vehicle, surrounding_vehicles):
-        """Determine activation signals based on FSM from Figure 3"""
+    def determine_activation_signals(self, ego_vehicle, surrounding_vehicles, index=None):
+        """
+        Determine activation signals based on FSM from Figure 3.
+        With a SpatialIndex over the surrounding vehicles, the neighbor queries
+        use binary searches instead of a scan over every vehicle.
+        """
         # Extract ego vehicle state
         ego_x, ego_y = ego_vehicle.state[0], ego_vehicle.state[1]
         ego_v_x = ego_vehicle.state[2]
@@ -25,23 +34,27 @@ class DecisionMaking:
         s_long = self.TTC * ego_v_x  # Mitigation zone
         
         # Identify relevant vehicles
-        for vehicle in surrounding_vehicles:
-            veh_x, veh_y = vehicle.state[0], vehicle.state[1]
-            delta_x = veh_x - ego_x
-            delta_y = veh_y - ego_y
+        with self.profiler.span('neighbor_query', 'fsm'):
+            if index is not None:
+                emergency_brake, front_vehicle, adjacent_lane_blocked = self.query_neighbors(ego_x, ego_y, index)
+            else:
+                for vehicle in surrounding_vehicles:
+                    veh_x, veh_y = vehicle.state[0], vehicle.state[1]
+                    delta_x = veh_x - ego_x
+                    delta_y = veh_y - ego_y
             
-            # Check emergency braking condition
-            if abs(delta_y) <= 1 and 0 < delta_x < 5:  # Immediate collision risk
-                emergency_brake = True
+                    # Check emergency braking condition
+                    if abs(delta_y) <= 1 and 0 < delta_x < 5:  # Immediate collision risk
+                        emergency_brake = True
                 
-            # Front vehicle in same lane
-            if abs(delta_y) <= 0.5 and delta_x > 0:
-                if front_vehicle is None or delta_x < front_vehicle[0]:
-                    front_vehicle = (delta_x, vehicle)
+                    # Front vehicle in same lane
+                    if abs(delta_y) <= 0.5 and delta_x > 0:
+                        if front_vehicle is None or delta_x < front_vehicle[0]:
+                            front_vehicle = (delta_x, vehicle)
             
-            # Adjacent lane vehicles
-            if abs(abs(delta_y) - 3.5) < 0.5 and -20 < delta_x < 50:
-                adjacent_lane_blocked = True
+                    # Adjacent lane vehicles
+                    if abs(abs(delta_y) - 3.5) < 0.5 and -20 < delta_x < 50:
+                        adjacent_lane_blocked = True
 
         # FSM state transitions (Figure 3 logic)
         if self.current_state == "Lane Keeping":
@@ -141,3 +154,39 @@ class DecisionMaking:
                 self.eta = 0
         
         return self.delta, self.eta, self.current_state
+
+    def snapshot(self):
+        """FSM state and lane change progress (Simulation.checkpoint)"""
+        return {'current_state': self.current_state, 'delta': int(self.delta), 'eta': int(self.eta),
+                'lane_change_progress': int(self.lane_change_progress), 'abort_flag': bool(self.abort_flag)}
+
+    def restore(self, snapshot):
+        """Return to the FSM state of a snapshot"""
+        for name, value in snapshot.items():
+            setattr(self, name, value)
+
+    def query_neighbors(self, ego_x, ego_y, index):
+        """Emergency brake flag, front vehicle (delta_x, vehicle) and adjacent lane flag from a SpatialIndex"""
+        traffic = index.traffic
+
+        # Immediate collision risk: |delta_y| <= 1 and 0 < delta_x < 5
+        cols = index.candidates(ego_x, ego_x + 5, ego_y - 1, ego_y + 1)
+        delta_x = traffic.x[cols] - ego_x
+        emergency_brake = bool(np.any((delta_x > 0) & (delta_x < 5)))
+
+        # Front vehicle in same lane: |delta_y| <= 0.5 and delta_x > 0
+        front_vehicle = None
+        col = index.nearest_ahead(ego_x, ego_y - 0.5, ego_y + 0.5)
+        if col is not None:
+            front_vehicle = (traffic.x[col] - ego_x, traffic.vehicles[col])
+
+        # Adjacent lane vehicles: ||delta_y| - 3.5| < 0.5 and -20 < delta_x < 50
+        adjacent_lane_blocked = False
+        for y_lo, y_hi in ((ego_y + 3, ego_y + 4), (ego_y - 4, ego_y - 3)):
+            cols = index.candidates(ego_x - 20, ego_x + 50, y_lo, y_hi)
+            delta_x = traffic.x[cols] - ego_x
+            delta_y = traffic.y[cols] - ego_y
+            if np.any((np.abs(np.abs(delta_y) - 3.5) < 0.5) & (delta_x > -20) & (delta_x < 50)):
+                adjacent_lane_blocked = True
+
+        return emergency_brake, front_vehicle, adjacent_lane_blocked
@@ -0,0 +1,167 @@
+import json
+import os
+import numpy as np
+
+# Logged signals: name -> (per-step shape, dtype). 'vehicles' is filled with the full state of
+# every non-ego vehicle, giving a [step, vehicle, state] array. With a barrier_grid, 'barriers'
+# holds the barrier curve of every non-ego vehicle over that grid, a [step, vehicle, point] array.
+SIGNALS = {
+    'time': ((), np.float64),
+    'ego_x': ((), np.float64),
+    'ego_y': ((), np.float64),
+    'ego_vx': ((), np.float64),
+    'ego_vy': ((), np.float64),
+    'ego_ax': ((), np.float64),
+    'ego_ay': ((), np.float64),
+    'fsm_state': ((), np.int16),  # Index into the 'fsm_states' list of the metadata
+    'decision_time': ((), np.float64),
+    'solve_time': ((), np.float64),
+    'command_delay': ((), np.float64),  # Age of the applied command (time since its state sample)
+}
+
+class SimulationLogger:
+    def __init__(self, num_steps, vehicle_ids, log_dir=None, chunk_size=256, dt=None, barrier_grid=None,
+                 ego_size=None, vehicle_sizes=None, road=None):
+        """
+        Columnar logger with buffers preallocated for num_steps.
+
+        With a log_dir, every signal is a .npy file preallocated on disk; the logger only
+        keeps chunk_size steps in memory and copies full chunks into the files, which can
+        be memory-mapped by load_log. Without a log_dir everything stays in memory.
+        ego_size (length, width), vehicle_sizes (one pair per vehicle) and the road
+        bounds (y_min, y_max) are stored in the metadata for the post-run analytics.
+        """
+        self.num_steps = num_steps
+        self.vehicle_ids = [str(veh_id) for veh_id in vehicle_ids]
+        self.log_dir = log_dir
+        self.dt = dt
+        self.barrier_grid = None if barrier_grid is None else [float(x) for x in barrier_grid]
+        self.ego_size = None if ego_size is None else [float(x) for x in ego_size]
+        self.vehicle_sizes = None if vehicle_sizes is None else [[float(x) for x in size] for size in vehicle_sizes]
+        self.road = None if road is None else [float(x) for x in road]
+        self.count = 0    # Steps logged
+        self.flushed = 0  # Steps copied to the output arrays
+        self.fsm_states = []
+
+        shapes = dict(SIGNALS, vehicles=((len(self.vehicle_ids), 6), np.float64))
+        if self.barrier_grid is not None:
+            shapes['barriers'] = ((len(self.vehicle_ids), len(self.barrier_grid)), np.float64)
+        self.chunk_size = max(1, min(chunk_size, num_steps)) if log_dir else num_steps
+        self.buffers = {name: np.zeros((self.chunk_size,) + shape, dtype=dtype)
+                        for name, (shape, dtype) in shapes.items()}
+
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            self.outputs = {name: np.lib.format.open_memmap(os.path.join(log_dir, f'{name}.npy'), mode='w+',
+                                                            dtype=dtype, shape=(num_steps,) + shape)
+                            for name, (shape, dtype) in shapes.items()}
+            self.write_metadata()
+        else:
+            self.outputs = self.buffers
+
+    def log_step(self, time, ego_state, vehicle_states, fsm_state, decision_time, solve_time, command_delay=0.0,
+                 barriers=None):
+        """
+        Record one simulation step; vehicle_states has shape (6, num_vehicles) and
+        barriers (logged with a barrier_grid) has shape (num_vehicles, grid points)
+        """
+        if self.count >= self.num_steps:
+            raise IndexError("Logger is full")
+        if fsm_state not in self.fsm_states:
+            self.fsm_states.append(fsm_state)
+
+        k = self.count - self.flushed
+        buf = self.buffers
+        buf['time'][k] = time
+        buf['ego_x'][k], buf['ego_y'][k], buf['ego_vx'][k], buf['ego_vy'][k], buf['ego_ax'][k], buf['ego_ay'][k] = ego_state[:6]
+        buf['fsm_state'][k] = self.fsm_states.index(fsm_state)
+        buf['decision_time'][k] = decision_time
+        buf['solve_time'][k] = solve_time
+        buf['command_delay'][k] = command_delay
+        buf['vehicles'][k] = vehicle_states.T
+        if barriers is not None:
+            buf['barriers'][k] = barriers
+        self.count += 1
+
+        if self.log_dir and self.count - self.flushed == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Copy the buffered steps into the output files"""
+        if not self.log_dir or self.count == self.flushed:
+            return
+        n = self.count - self.flushed
+        for name, output in self.outputs.items():
+            output[self.flushed:self.count] = self.buffers[name][:n]
+            output.flush()
+        self.flushed = self.count
+        self.write_metadata()
+
+    def write_metadata(self):
+        """Number of valid steps and the lookup tables needed to read the log"""
+        meta = {'num_steps': self.count, 'capacity': self.num_steps, 'dt': self.dt,
+                'vehicle_ids': self.vehicle_ids, 'fsm_states': self.fsm_states, 'barrier_grid': self.barrier_grid,
+                'ego_size': self.ego_size, 'vehicle_sizes': self.vehicle_sizes, 'road': self.road}
+        tmp_path = os.path.join(self.log_dir, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.log_dir, 'meta.json'))
+
+    def snapshot(self):
+        """Steps logged so far and the FSM state table (Simulation.checkpoint)"""
+        return {'fsm_states': list(self.fsm_states),
+                'signals': {name: np.array(self.get(name)) for name in self.outputs}}
+
+    def restore(self, snapshot):
+        """Continue an empty logger after the steps of a snapshot, which are copied in first"""
+        if self.count:
+            raise ValueError("Can only restore into an empty logger")
+        num_logged = len(snapshot['signals']['time'])
+        missing = set(self.outputs) - set(snapshot['signals'])
+        if missing:
+            raise ValueError(f"Snapshot does not contain the logged signals {sorted(missing)}")
+        if num_logged > self.num_steps:
+            raise IndexError("Snapshot does not fit into the logger")
+        for name, output in self.outputs.items():
+            output[:num_logged] = snapshot['signals'][name]
+        self.fsm_states = list(snapshot['fsm_states'])
+        self.count = num_logged
+        if self.log_dir:
+            self.flushed = num_logged
+            for output in self.outputs.values():
+                output.flush()
+            self.write_metadata()
+
+    def close(self):
+        """Flush the remaining steps"""
+        self.flush()
+
+    def get(self, name):
+        """Logged values of a signal for the steps recorded so far"""
+        self.flush()
+        return self.outputs[name][:self.count]
+
+    def get_fsm_states(self):
+        """Logged FSM states as strings"""
+        return np.array(self.fsm_states, dtype=str)[self.get('fsm_state')] if self.fsm_states else np.array([], dtype=str)
+
+def load_log(log_dir, mmap_mode='r', signals=None):
+    """
+    Load a log written by SimulationLogger. Signals are memory-mapped by default
+    and trimmed to the steps actually recorded; 'fsm_state' is decoded to strings.
+    signals selects the signal files to open (default: all).
+    """
+    with open(os.path.join(log_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    num_steps = meta['num_steps']
+    names = list(SIGNALS) + ['vehicles'] + (['barriers'] if meta.get('barrier_grid') is not None else [])
+    data = {name: np.load(os.path.join(log_dir, f'{name}.npy'), mmap_mode=mmap_mode)[:num_steps]
+            for name in (names if signals is None else signals)}
+    if 'fsm_state' in data:
+        data['fsm_state'] = np.array(meta['fsm_states'], dtype=str)[data['fsm_state']] if meta['fsm_states'] \
+            else np.array([], dtype=str)
+    data['vehicle_ids'] = meta['vehicle_ids']
+    data['dt'] = meta['dt']
+    for name in ('barrier_grid', 'ego_size', 'vehicle_sizes', 'road'):
+        data[name] = None if meta.get(name) is None else np.array(meta[name])
+    return data
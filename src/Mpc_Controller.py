@@ -4,26 +4,101 @@ import os
 import sys
 import warnings
 import contextlib
+import hashlib
+import inspect
+import json
+import subprocess
+import tempfile
+import threading
+import time
+
+from Profiler import Profiler
+
+# Output redirection is process-wide: concurrent solves (one thread per agent) share one
+# redirection that is undone when the last of them leaves suppress_all_output
+_output_lock = threading.Lock()
+_suppressed = {'depth': 0, 'streams': None, 'fnull': None}
 
 @contextlib.contextmanager
 def suppress_all_output():
-    with open(os.devnull, 'w') as fnull:
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = fnull
-        sys.stderr = fnull
-        try:
-            yield
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+    with _output_lock:
+        if _suppressed['depth'] == 0:
+            _suppressed['fnull'] = open(os.devnull, 'w')
+            _suppressed['streams'] = (sys.stdout, sys.stderr)
+            sys.stdout = sys.stderr = _suppressed['fnull']
+        _suppressed['depth'] += 1
+    try:
+        yield
+    finally:
+        with _output_lock:
+            _suppressed['depth'] -= 1
+            if _suppressed['depth'] == 0:
+                sys.stdout, sys.stderr = _suppressed['streams']
+                _suppressed['fnull'].close()
+
+def shift_horizon(vec, blocks):
+    """
+    Shift stage-major blocks of a vector one stage forward (receding horizon).
+    Each block is (offset, num_stages, stride); the last stage is repeated.
+    """
+    shifted = vec.copy()
+    for offset, num_stages, stride in blocks:
+        if num_stages > 1:
+            end = offset + num_stages * stride
+            shifted[offset:end - stride] = vec[offset + stride:end]
+    return shifted
+
+def horizon_blocks(sizes):
+    """Contiguous stride-1 blocks (offset, num_stages, 1) for vectors of the given sizes"""
+    offsets = np.cumsum([0] + list(sizes[:-1]))
+    return [(int(offset), size, 1) for offset, size in zip(offsets, sizes)]
 
 class MPC:
-    def __init__(self, dt=0.2, N_p=20, N_c=3):
+    def __init__(self, dt=0.2, N_p=20, N_c=3, parametric=True, warm_start=True,
+                 codegen=False, cache_dir=None, codegen_flags=('-O1',), obstacle_range=None,
+                 num_obstacle_slots=None, backend='ipopt', sqp_max_iter=10, qp_solver=None,
+                 time_budget=None):
         """Initialize MPC controller with prediction and control horizons"""
         self.dt = dt
         self.N_p = N_p  # Prediction horizon
         self.N_c = N_c  # Control horizon
+        self.parametric = parametric  # Build the NLP once and only update parameters per step
+        self._problems = {}  # Cached NLPs keyed by problem_key (horizons, obstacle slots, weights, bounds, ...)
+        # Control steps handled so far (solves and reused plans). The stored iterate and plan are
+        # stamped with the step that produced them and shifted by the steps elapsed since
+        self._step = 0
+        self._prev = None  # Last primal/dual iterate (optimal or interrupted) and its problem key
+        self._plan = None  # Controls of the last usable solution, the fallback of later steps
+        self.warm_start = warm_start  # Seed each solve with the shifted previous primal/dual solution
+        self.obstacle_range = obstacle_range  # Only vehicles within this radius [m] become obstacles (None = all)
+        self.num_obstacle_slots = num_obstacle_slots  # Fixed number of obstacle slots (None = one per vehicle)
+
+        # Solver backend: 'ipopt' (full NLP solve), 'sqp' (Gauss-Newton SQP with at most
+        # sqp_max_iter QPs) or 'rti' (real-time iteration: one QP around the shifted plan)
+        if backend not in ('ipopt', 'sqp', 'rti'):
+            raise ValueError(f"Unknown MPC backend: {backend}")
+        self.backend = backend
+        self.sqp_max_iter = sqp_max_iter
+        self.sqp_tol = 1e-6  # Step size [inf-norm] at which the SQP iterations stop
+        # Sparse QP solvers first: qpOASES is dense and starts cold at every step
+        self.qp_solver = qp_solver if qp_solver else next(
+            name for name in ('osqp', 'qrqp', 'qpoases') if ca.has_conic(name))
+
+        # Per-step solve deadline [s] (None = solve to convergence). When a solve fails or
+        # runs out of time, the control falls back to the last iterate if it is feasible,
+        # then to the last usable plan (at most max_plan_age steps old), then to emergency braking.
+        # An interrupted solve warm starts the next one, so its iterations carry over.
+        self.time_budget = time_budget
+        self.feasibility_tol = 1e-3  # Max constraint violation of a usable iterate
+        self.max_plan_age = N_p - 1  # Steps a usable plan may be shifted before it expires
+        self.reset_counters()
+        self.profiler = Profiler(enabled=False)  # Replaced by the simulation's profiler when profiling
+
+        # Compile the NLP functions to a shared library cached on disk (IPOPT backend). This only
+        # shortens startup: the per-step time is dominated by IPOPT itself, not the function calls
+        self.codegen = codegen
+        self.cache_dir = cache_dir if cache_dir else os.path.join(os.path.expanduser('~'), '.cache', 'avcas_mpc')
+        self.codegen_flags = list(codegen_flags)
         
         # Define bounds for acceleration inputs
         self.a_ex_min = -4.0  # m/s²
@@ -71,13 +146,550 @@ class MPC:
         self.slack_y = self.opti.variable(self.N_p)       # Road boundary slack
         self.slack_barrier = self.opti.variable(self.N_p) # Barrier slack
 
-    def solve(self, ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker, y_ref, v_des):
-        """Solve the MPC optimization problem with full constraints"""
+    def solve(self, ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker, y_ref, v_des, signals=None,
+              index=None):
+        """
+        Solve the MPC optimization problem with full constraints.
+
+        signals is the (delta, eta) pair from the decision stage of the current step.
+        If omitted, the decision maker is evaluated once here.
+        index is an optional SpatialIndex over surrounding_vehicles used to select
+        the obstacles within obstacle_range.
+        With num_obstacle_slots set, the problem always has that many obstacle slots;
+        the most relevant vehicles fill them and unused slots are deactivated.
+        With time_budget set, the solve is stopped at the deadline and the fallback chain
+        (feasible iterate, shifted last usable plan, emergency braking) provides the control.
+        """
 
         # Validate inputs
         if ego_vehicle is None or len(ego_vehicle.state) < 6:
             raise ValueError("Invalid ego vehicle state")
-        
+
+        # Get activation signals from decision maker (once per control step)
+        if signals is None:
+            delta, eta, _ = decision_maker.determine_activation_signals(ego_vehicle, surrounding_vehicles)
+        else:
+            delta, eta = signals
+
+        # Obstacle selection
+        with self.profiler.span('obstacle_selection', 'mpc'):
+            surrounding_vehicles = self.select_obstacles(ego_vehicle, surrounding_vehicles, index)
+
+        if not self.parametric:
+            with self.profiler.span('solve_rebuild', 'mpc'):
+                return self.solve_rebuild(ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker,
+                                          y_ref, v_des, delta, eta)
+
+        # Fetch (or build once) the cached problem for this configuration
+        num_slots = len(surrounding_vehicles) if self.num_obstacle_slots is None else self.num_obstacle_slots
+        key = self.problem_key(num_slots)
+        problem = self.get_problem(num_slots)
+        self._step += 1
+
+        # Parameter vector (same layout as in formulate_problem).
+        # Unused slots sit at the ego position, their constraints are switched off by active = 0
+        x0 = ego_vehicle.state[:4]
+        obs_x = np.full(num_slots, x0[0])
+        obs_y = np.full(num_slots, x0[1])
+        active = np.zeros(num_slots)
+        for j, veh in enumerate(surrounding_vehicles):
+            obs_x[j], obs_y[j], active[j] = veh.state[0], veh.state[1], 1.0
+        p = np.concatenate([x0,
+                            [y_ref, v_des, ego_vehicle.width / 2,
+                             sigmoid_barrier.zeta, sigmoid_barrier.y_lat,
+                             decision_maker.TIV, decision_maker.TTC],
+                            np.full(self.N_p, delta), np.full(self.N_p, eta), obs_x, obs_y, active])
+
+        # ---- Initial Conditions ----
+        guess = {}
+        prev = self._prev
+        if (self.warm_start and prev is not None and prev['key'] == key
+                and self._step - prev['step'] <= self.max_plan_age):
+            # Previous iterate (optimal or interrupted) and multipliers shifted by the steps since.
+            # An iterate of another problem (obstacle count changed in between) is not used
+            guess['x0'], guess['lam_x0'], guess['lam_g0'] = prev['x'], prev['lam_x'], prev['lam_g']
+            for _ in range(self._step - prev['step']):
+                guess['x0'] = shift_horizon(guess['x0'], problem['w_blocks'])
+                guess['lam_x0'] = shift_horizon(guess['lam_x0'], problem['w_blocks'])
+                guess['lam_g0'] = shift_horizon(guess['lam_g0'], problem['g_blocks'])
+            guess['x0'] = guess['x0'].copy()
+            guess['x0'][:4 * self.N_p:self.N_p] = x0
+        else:
+            # Current state held constant over the horizon
+            w0 = np.zeros(problem['n_w'])
+            for k, val in enumerate(x0):
+                w0[k * self.N_p:(k + 1) * self.N_p] = val
+            guess['x0'] = w0
+
+        # Before the first usable plan the only fallback is braking, so the initial solve
+        # (the controller's initialization) runs to convergence regardless of time_budget
+        budgeted = self.time_budget is not None and self._plan is not None
+
+        start = time.perf_counter()
+        try:
+            # Solve the optimization problem
+            if self.backend == 'ipopt':
+                solver = problem['solver'] if budgeted or self.time_budget is None else self.initial_solver(problem)
+                result = self.solve_ipopt(problem, p, guess, solver)
+            else:
+                max_iter = 1 if self.backend == 'rti' else self.sqp_max_iter
+                result = self.solve_sqp(problem, p, guess['x0'], max_iter, self.time_budget if budgeted else None)
+        except Exception as e:
+            # print(f"Optimization failed: {e}")
+            warnings.filterwarnings("ignore")
+            result = {'status': 'failed'}
+        if result['status'] == 'timeout' or (self.time_budget is not None
+                                             and time.perf_counter() - start > self.time_budget):
+            self.counters['deadline_misses'] += 1
+
+        # Any iterate warm starts the next solve, so an interrupted solve continues at the next step
+        if 'x' in result:
+            self._prev = {'x': result['x'], 'lam_x': result['lam_x'], 'lam_g': result['lam_g'],
+                          'key': key, 'step': self._step}
+
+        # Fallback chain: converged solution, feasible iterate, shifted last usable plan, emergency braking
+        if result['status'] == 'solved':
+            self.counters['solved'] += 1
+        elif 'x' in result and self.is_feasible(problem, result):
+            self.counters['feasible_iterate'] += 1
+        elif self.plan_control(self._step, self.max_plan_age) is not None:
+            self.counters['shifted_plan'] += 1
+            a_ex, a_ey = self.plan_control(self._step, self.max_plan_age)
+            return a_ex, a_ey, []
+        else:
+            self.counters['emergency_brake'] += 1
+            return -2.0, 0.0, []  # Fallback values [Emergency Braking]
+
+        # Extract optimal control inputs for the first step
+        w_opt = result['x']
+        idx_a_ex, idx_a_ey = problem['idx_a_ex'], problem['idx_a_ey']
+        self._plan = {'a_ex': w_opt[idx_a_ex:idx_a_ex + self.N_c].copy(),
+                      'a_ey': w_opt[idx_a_ey:idx_a_ey + self.N_c].copy(), 'step': self._step}
+        a_ex_opt = w_opt[idx_a_ex]
+        a_ey_opt = w_opt[idx_a_ey]
+
+        return a_ex_opt, a_ey_opt, []
+
+    def plan_control(self, step, max_age):
+        """
+        Control (a_ex, a_ey) of the last usable plan at a control step, or None when there is
+        no plan or it is more than max_age steps old. The plan holds its last control move.
+        """
+        plan = self._plan
+        if plan is None or step - plan['step'] > max_age:
+            return None
+        k = min(step - plan['step'], len(plan['a_ex']) - 1)
+        return plan['a_ex'][k], plan['a_ey'][k]
+
+    def reuse_plan(self, max_age=None):
+        """
+        Control of the last usable plan at the next step, without solving (cruise steps).
+        Returns None when there is no plan or it is more than max_age (default max_plan_age)
+        steps old; the step then still has to be solved.
+        """
+        max_age = self.max_plan_age if max_age is None else min(max_age, self.max_plan_age)
+        control = self.plan_control(self._step + 1, max_age)
+        if control is None:
+            return None
+        self._step += 1
+        self.counters['reused_plan'] += 1
+        return control
+
+    def is_feasible(self, problem, result):
+        """Whether an unconverged iterate satisfies all bounds and constraints within feasibility_tol"""
+        w, g = result['x'], result['g']
+        violation = max(np.max(problem['lbx'] - w), np.max(w - problem['ubx']),
+                        np.max(problem['lbg'] - g), np.max(g - problem['ubg']))
+        return bool(np.isfinite(w).all() and violation <= self.feasibility_tol)
+
+    def solve_ipopt(self, problem, p, guess, solver):
+        """
+        Solve the NLP with an IPOPT solver of the problem (the budgeted one stops at
+        time_budget through max_wall_time). Returns the last iterate as a dict with x,
+        lam_x, lam_g, g and a status of 'solved', 'timeout' or 'failed'.
+        """
+        with self.profiler.span('ipopt', 'mpc') as span, suppress_all_output():
+            sol = solver(p=p, lbx=problem['lbx'], ubx=problem['ubx'],
+                         lbg=problem['lbg'], ubg=problem['ubg'], **guess)
+            stats = solver.stats()
+            span.set(iter_count=stats['iter_count'], return_status=stats['return_status'],
+                     t_wall_total=stats.get('t_wall_total'))
+        self.iter_counts.append(stats['iter_count'])
+        self.profiler.count('ipopt_iter_count', stats['iter_count'])
+        if stats['success']:
+            status = 'solved'
+        elif stats['return_status'] in ('Maximum_WallTime_Exceeded', 'Maximum_CpuTime_Exceeded'):
+            status = 'timeout'
+        else:
+            status = 'failed'
+        return {'x': sol['x'].full().ravel(), 'lam_x': sol['lam_x'].full().ravel(),
+                'lam_g': sol['lam_g'].full().ravel(), 'g': sol['g'].full().ravel(), 'status': status}
+
+    def solve_sqp(self, problem, p, w0, max_iter, time_budget):
+        """
+        Gauss-Newton SQP: every iteration linearizes the constraints (the sigmoid barrier
+        is the only nonlinear one) around the current iterate and solves one QP for the step.
+        The cost is quadratic, so its Hessian is constant. With max_iter=1 and the shifted
+        previous plan as w0 this is the real-time iteration scheme. The iterations are counted
+        against time_budget (None = no deadline): no further QP is started when it would end
+        past it.
+        A QP failing after the first iteration ends the solve with the iterate reached so far.
+        Returns a dict like solve_ipopt.
+        """
+        qp = problem['qp']
+        start = time.perf_counter()
+        w = w0.copy()
+        status = 'failed'
+        for iteration in range(1, max_iter + 1):
+            g, jac_g, grad_f = qp['linearize'](w, p)
+            g = g.full().ravel()
+            with self.profiler.span('qp', 'mpc', iteration=iteration), suppress_all_output():
+                qp_sol = qp['solver'](h=qp['H'], g=grad_f, a=jac_g,
+                                      lba=problem['lbg'] - g, uba=problem['ubg'] - g,
+                                      lbx=problem['lbx'] - w, ubx=problem['ubx'] - w)
+            if not qp['solver'].stats()['success']:
+                if iteration == 1:
+                    self.iter_counts.append(iteration)
+                    raise RuntimeError(qp['solver'].stats()['return_status'])
+                break
+            sol = qp_sol
+            step = sol['x'].full().ravel()
+            w = w + step
+            if np.max(np.abs(step)) < self.sqp_tol or max_iter == 1:
+                status = 'solved'
+                break
+            elapsed = time.perf_counter() - start
+            if time_budget is not None and elapsed * (iteration + 1) / iteration > time_budget:
+                status = 'timeout'
+                break
+        self.iter_counts.append(iteration)
+        self.profiler.count('sqp_iter_count', iteration)
+
+        result = {'x': w, 'lam_x': sol['lam_x'].full().ravel(), 'lam_g': sol['lam_a'].full().ravel(),
+                  'status': status}
+        if status != 'solved':
+            result['g'] = qp['linearize'](w, p)[0].full().ravel()
+        return result
+
+    def build_qp(self, nlp):
+        """Linearization function, constant cost Hessian and QP solver used by the SQP/RTI backends"""
+        w, p = nlp['x'], nlp['p']
+        jac_g = ca.jacobian(nlp['g'], w)
+        linearize = ca.Function('linearize', [w, p], [nlp['g'], jac_g, ca.gradient(nlp['f'], w)])
+        H = ca.Function('H', [w, p], [ca.hessian(nlp['f'], w)[0]])(0, 0)
+
+        opts = {'error_on_fail': False}
+        if self.qp_solver == 'qpoases':
+            opts.update({'printLevel': 'none', 'hessian_type': 'semidef'})
+        elif self.qp_solver == 'osqp':
+            # Polishing refines the ADMM solution (about 1e-3 accurate) on the active set,
+            # so the SQP steps converge to sqp_tol in a few iterations
+            opts['osqp'] = {'verbose': False, 'polish': True}
+        with suppress_all_output():
+            solver = ca.conic('mpc_qp', self.qp_solver, {'h': H.sparsity(), 'a': jac_g.sparsity()}, opts)
+        return {'linearize': linearize, 'H': H, 'solver': solver}
+
+    def select_obstacles(self, ego_vehicle, surrounding_vehicles, index=None):
+        """
+        Vehicles that become MPC obstacles: those within obstacle_range (when an index is given),
+        reduced to the num_obstacle_slots most relevant ones. Relevance is the smaller of the
+        time to collision and the time gap at the ego speed; the original order is kept.
+        """
+        if index is not None and self.obstacle_range is not None:
+            cols = np.sort(index.within(ego_vehicle.state[0], ego_vehicle.state[1], self.obstacle_range))
+            surrounding_vehicles = [index.traffic.vehicles[col] for col in cols]
+
+        if self.num_obstacle_slots is None or len(surrounding_vehicles) <= self.num_obstacle_slots:
+            return list(surrounding_vehicles)
+
+        ego_x, ego_y, ego_v_x = ego_vehicle.state[0], ego_vehicle.state[1], ego_vehicle.state[2]
+        states = np.array([veh.state[:3] for veh in surrounding_vehicles])
+        delta_x = states[:, 0] - ego_x
+        gap = np.hypot(delta_x, states[:, 1] - ego_y)
+
+        # Closing speed is positive when the gap shrinks (ego catching up, or a vehicle behind catching up)
+        closing = np.where(delta_x >= 0, ego_v_x - states[:, 2], states[:, 2] - ego_v_x)
+        ttc = np.full(len(surrounding_vehicles), np.inf)
+        np.divide(np.abs(delta_x), closing, out=ttc, where=closing > 1e-6)
+        time_gap = gap / max(ego_v_x, 1.0)
+        relevance = np.minimum(ttc, time_gap)
+
+        keep = np.sort(np.argsort(relevance, kind='stable')[:self.num_obstacle_slots])
+        return [surrounding_vehicles[k] for k in keep]
+
+    def reset_counters(self):
+        """Clear the iteration counts and the deadline/fallback counters"""
+        self.iter_counts = []  # Solver iterations of every parametric solve
+        # Steps over time_budget and how the control of every step was obtained
+        self.counters = {'deadline_misses': 0, 'solved': 0, 'feasible_iterate': 0,
+                         'shifted_plan': 0, 'emergency_brake': 0, 'reused_plan': 0}
+
+    def reset_warm_start(self):
+        """Forget the stored iterate and plan so the next solve starts cold"""
+        self._prev = None
+        self._plan = None
+
+    def snapshot(self):
+        """
+        Warm start, usable plan (with their step stamps) and counters, so a restored
+        controller continues with the same solver iterates and fallbacks
+        """
+        prev = None if self._prev is None else {**self._prev, 'key': list(self._prev['key'])}
+        plan = None if self._plan is None else dict(self._plan)
+        return {'step': self._step, 'prev': prev, 'plan': plan,
+                'counters': dict(self.counters), 'iter_counts': [int(n) for n in self.iter_counts]}
+
+    def restore(self, snapshot):
+        """Return to the warm start, plan and counters of a snapshot"""
+        def stored(value):
+            if value is None:
+                return None
+            return {field: (tuple(item) if field == 'key' else int(item) if field == 'step'
+                            else np.array(item, dtype=np.float64))
+                    for field, item in value.items()}
+
+        self._step = int(snapshot['step'])
+        self._prev = stored(snapshot['prev'])
+        self._plan = stored(snapshot['plan'])
+        self.counters = dict(snapshot['counters'])
+        self.iter_counts = list(snapshot['iter_counts'])
+
+    def get_problem(self, num_vehicles):
+        """
+        Return the cached NLP for num_vehicles obstacle slots and the current settings, building
+        it on first use. Changing a weight or bound after a solve builds a new problem.
+        """
+        key = self.problem_key(num_vehicles)
+        if key not in self._problems:
+            with self.profiler.span('build_problem', 'mpc', num_vehicles=num_vehicles):
+                self._problems[key] = self.build_problem(num_vehicles)
+        return self._problems[key]
+
+    def build_problem(self, num_vehicles):
+        """Build (or load from the codegen cache) the solver for num_vehicles obstacles"""
+        problem = self.problem_layout(num_vehicles)
+        opts = self.solver_options()
+
+        if self.backend != 'ipopt':
+            problem['qp'] = self.build_qp(self.formulate_problem(num_vehicles))
+        elif self.codegen:
+            problem['solver'] = self.load_compiled_solver(num_vehicles, opts)
+        else:
+            nlp = self.formulate_problem(num_vehicles)
+            problem['solver'] = ca.nlpsol('mpc_solver', 'ipopt', nlp, opts)
+        return problem
+
+    def initial_solver(self, problem):
+        """IPOPT solver of a problem without the time budget, for its initial solve (built on first use)"""
+        if problem['initial_solver'] is None:
+            opts = self.solver_options(budgeted=False)
+            with self.profiler.span('build_problem', 'mpc', num_vehicles=problem['num_vehicles']):
+                if self.codegen:
+                    problem['initial_solver'] = self.load_compiled_solver(problem['num_vehicles'], opts)
+                else:
+                    problem['initial_solver'] = ca.nlpsol('mpc_solver', 'ipopt',
+                                                          self.formulate_problem(problem['num_vehicles']), opts)
+        return problem['initial_solver']
+
+    def formulate_problem(self, num_vehicles):
+        """
+        Formulate the MPC NLP with every per-step quantity as a parameter.
+
+        The cost and constraints are vector expressions over the whole horizon
+        (and all vehicles), built with SX so the expanded graph stays compact.
+        Decision vector w = [X, Y, v_x, v_y, a_ex, a_ey, da_ex, da_ey, slack_y, slack_barrier, vec(xi_x)].
+        Parameter vector p = [x0, y0, vx0, vy0, y_ref, v_des, half_width, zeta, y_lat, TIV, TTC,
+        delta (N_p), eta (N_p), obs_x (num_vehicles), obs_y (num_vehicles), active (num_vehicles)].
+        An obstacle slot with active = 0 has its barrier and braking constraints switched off.
+        The constraint order matches the bounds from problem_layout.
+        """
+        N_p, N_c, n = self.N_p, self.N_c, num_vehicles
+
+        # Decision variables
+        X = ca.SX.sym('X', N_p)
+        Y = ca.SX.sym('Y', N_p)
+        v_x = ca.SX.sym('v_x', N_p)
+        v_y = ca.SX.sym('v_y', N_p)
+        a_ex = ca.SX.sym('a_ex', N_c)
+        a_ey = ca.SX.sym('a_ey', N_c)
+        da_ex = ca.SX.sym('da_ex', N_c - 1)
+        da_ey = ca.SX.sym('da_ey', N_c - 1)
+        slack_y = ca.SX.sym('slack_y', N_p)
+        slack_barrier = ca.SX.sym('slack_barrier', N_p)
+        xi_x = ca.SX.sym('xi_x', N_p, n)  # One column of braking slacks per vehicle
+
+        # Parameters
+        x0 = ca.SX.sym('x0', 4)
+        y_ref = ca.SX.sym('y_ref')
+        v_des = ca.SX.sym('v_des')
+        half_width = ca.SX.sym('half_width')
+        zeta = ca.SX.sym('zeta')
+        y_lat = ca.SX.sym('y_lat')
+        TIV = ca.SX.sym('TIV')
+        TTC = ca.SX.sym('TTC')
+        delta = ca.SX.sym('delta', N_p)
+        eta = ca.SX.sym('eta', N_p)
+        obs_x = ca.SX.sym('obs_x', n)
+        obs_y = ca.SX.sym('obs_y', n)
+        active = ca.SX.sym('active', n)
+
+        # Cost function (Equation 14-15)
+        cost = (self.Q_lat * ca.sumsqr(Y - y_ref)
+                + self.Q_vel * ca.sumsqr(v_x - v_des)
+                + self.chi * (ca.sumsqr(slack_y) + ca.sumsqr(slack_barrier) + ca.sumsqr(xi_x))
+                + self.R_da_ex * ca.sumsqr(da_ex)
+                + self.R_da_ey * ca.sumsqr(da_ey))
+
+        # Dynamic constraints over prediction horizon (Equation 8),
+        # inputs are held at their last value beyond the control horizon
+        hold = [min(i, N_c - 1) for i in range(N_p - 1)]
+        dyn_vx = v_x[1:] - (v_x[:-1] + a_ex[hold] * self.dt)
+        dyn_vy = v_y[1:] - (v_y[:-1] + a_ey[hold] * self.dt)
+        dyn_y = Y[1:] - (Y[:-1] + v_y[:-1] * self.dt)
+        dyn_x = X[1:] - (X[:-1] + v_x[:-1] * self.dt)
+
+        # Jerk definition (Equations 16-21, bounds are applied on the variables)
+        jerk_x = da_ex - (a_ex[1:] - a_ex[:-1])
+        jerk_y = da_ey - (a_ey[1:] - a_ey[:-1])
+
+        # Road boundaries with slack and slip angle constraint (Eq. 21)
+        road_lo = Y + slack_y - (self.y_min + half_width)
+        road_hi = (self.y_max - half_width) + slack_y - Y
+        slip_lo = v_y + v_x * self.beta_max
+        slip_hi = v_x * self.beta_max - v_y
+
+        # Safety constraints (Equations 23-27) as N_p x num_vehicles matrices
+        M = 1e3
+        kappa = 10
+        delta_x = ca.repmat(obs_x.T, N_p, 1) - ca.repmat(X, 1, n)
+        delta_y = ca.repmat(obs_y.T, N_p, 1) - ca.repmat(Y, 1, n)
+        s_f = ca.repmat(TIV * v_x, 1, n)
+        on = ca.repmat(active.T, N_p, 1)
+        barrier = ca.repmat(delta * y_lat, 1, n) / (1 + ca.exp(-zeta * (-delta_x + s_f)))
+        conditional_exp = ca.if_else(delta_y <= 1, -delta_y, delta_y)
+        barrier_con = on * (conditional_exp - barrier) + ca.repmat(slack_barrier, 1, n)
+        # Braking constraint with Big-M method
+        braking_con = on * (delta_x - ca.repmat(TTC * v_x - M * eta, 1, n)) + kappa * xi_x
+
+        g = ca.vertcat(X[0] - x0[0], Y[0] - x0[1], v_x[0] - x0[2], v_y[0] - x0[3],
+                       dyn_vx, dyn_vy, dyn_y, dyn_x, jerk_x, jerk_y,
+                       road_lo, road_hi, slip_lo, slip_hi,
+                       ca.vec(barrier_con), ca.vec(braking_con))
+        w = ca.vertcat(X, Y, v_x, v_y, a_ex, a_ey, da_ex, da_ey, slack_y, slack_barrier, ca.vec(xi_x))
+        p = ca.vertcat(x0, y_ref, v_des, half_width, zeta, y_lat, TIV, TTC,
+                       delta, eta, obs_x, obs_y, active)
+
+        return {'x': w, 'p': p, 'f': cost, 'g': g}
+
+    def problem_layout(self, num_vehicles):
+        """Variable/constraint bounds, indices and warm-start blocks of the NLP for num_vehicles obstacles"""
+        N_p, N_c = self.N_p, self.N_c
+
+        # Variable bounds: acceleration, jerk and slack non-negativity (Section VII-D)
+        inf = np.inf
+        lbx = np.concatenate([np.full(4 * N_p, -inf),
+                              np.full(N_c, self.a_ex_min), np.full(N_c, self.a_ey_min),
+                              np.full(N_c - 1, -self.da_ex_max), np.full(N_c - 1, -self.da_ey_max),
+                              np.zeros((2 + num_vehicles) * N_p)])
+        ubx = np.concatenate([np.full(4 * N_p, inf),
+                              np.full(N_c, self.a_ex_max), np.full(N_c, self.a_ey_max),
+                              np.full(N_c - 1, self.da_ex_max), np.full(N_c - 1, self.da_ey_max),
+                              np.full((2 + num_vehicles) * N_p, inf)])
+
+        # Constraint bounds: equalities (initial state, dynamics, jerk) then inequalities g >= 0
+        n_eq = 4 + 4 * (N_p - 1) + 2 * (N_c - 1)
+        n_ineq = (4 + 2 * num_vehicles) * N_p
+        lbg = np.zeros(n_eq + n_ineq)
+        ubg = np.concatenate([np.zeros(n_eq), np.full(n_ineq, inf)])
+
+        # Horizon blocks (offset, num_stages, stride) used to shift warm starts
+        w_sizes = [N_p] * 4 + [N_c] * 2 + [N_c - 1] * 2 + [N_p] * (2 + num_vehicles)
+        g_sizes = [1] * 4 + [N_p - 1] * 4 + [N_c - 1] * 2 + [N_p] * (4 + 2 * num_vehicles)
+
+        return {
+            'num_vehicles': num_vehicles,
+            'n_w': len(lbx),
+            'lbx': lbx, 'ubx': ubx,
+            'lbg': lbg, 'ubg': ubg,
+            'idx_a_ex': 4 * N_p,
+            'idx_a_ey': 4 * N_p + N_c,
+            'w_blocks': horizon_blocks(w_sizes),
+            'g_blocks': horizon_blocks(g_sizes),
+            'initial_solver': None,  # IPOPT solver without time budget (built by initial_solver)
+        }
+
+    def solver_options(self, budgeted=True):
+        """IPOPT options shared by the symbolic and the compiled solvers (budgeted: stop at time_budget)"""
+        ipopt_opts = {"print_level": 0, "max_iter": 1000, "acceptable_tol": 1e-4,
+                      "acceptable_obj_change_tol": 1e-4}
+        if self.warm_start:
+            ipopt_opts.update({"warm_start_init_point": "yes",
+                               "warm_start_bound_push": 1e-6,
+                               "warm_start_slack_bound_push": 1e-6,
+                               "warm_start_mult_bound_push": 1e-6,
+                               "mu_init": 1e-5})
+        if budgeted and self.time_budget is not None:
+            ipopt_opts["max_wall_time"] = self.time_budget
+        return {"print_time": False, "record_time": True, "ipopt": ipopt_opts}
+
+    def problem_config(self, num_vehicles):
+        """Settings the formulated NLP is built with: horizon, dt, obstacles, bounds and weights"""
+        return {
+            'dt': self.dt, 'N_p': self.N_p, 'N_c': self.N_c, 'num_vehicles': num_vehicles,
+            'bounds': [self.a_ex_min, self.a_ex_max, self.a_ey_min, self.a_ey_max,
+                       self.da_ex_max, self.da_ey_max, self.y_min, self.y_max,
+                       self.vx_min, self.vx_max, self.beta_max],
+            'weights': [self.Q_lat, self.Q_vel, self.R_da_ex, self.R_da_ey, self.chi],
+        }
+
+    def problem_key(self, num_vehicles):
+        """Key of the in-memory problem cache: problem_config and the solver settings built into the solver"""
+        config = self.problem_config(num_vehicles)
+        return (config['N_p'], config['N_c'], num_vehicles, config['dt'], *config['bounds'], *config['weights'],
+                self.backend, self.qp_solver, self.warm_start, self.time_budget)
+
+    def cache_key(self, num_vehicles):
+        """Hash of everything the compiled NLP depends on: problem_config and the build flags"""
+        config = {
+            **self.problem_config(num_vehicles),
+            'casadi': ca.__version__,
+            'compiler': [os.environ.get('CC', 'cc'), *self.codegen_flags],
+            'formulation': inspect.getsource(self.formulate_problem),
+        }
+        return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+    def load_compiled_solver(self, num_vehicles, opts):
+        """
+        Load the NLP functions from a shared library in cache_dir, generating C code
+        and compiling it with the local C compiler on a cache miss.
+        """
+        key = self.cache_key(num_vehicles)
+        lib_file = os.path.join(self.cache_dir, f'mpc_{key}.so')
+
+        if not os.path.exists(lib_file):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            generator = ca.nlpsol('mpc_solver', 'ipopt', self.formulate_problem(num_vehicles), opts)
+
+            # Build in a private directory and move into place atomically so that
+            # concurrent worker processes never load a half-written library
+            with tempfile.TemporaryDirectory(dir=self.cache_dir) as build_dir:
+                # Equivalent of generator.generate_dependencies(), which only writes to the working directory
+                code = ca.CodeGenerator(f'mpc_{key}.c')
+                code.add(generator.oracle())
+                for name in ('nlp_f', 'nlp_g', 'nlp_grad', 'nlp_grad_f', 'nlp_jac_g', 'nlp_hess_l'):
+                    if generator.has_function(name):
+                        code.add(generator.get_function(name))
+                c_file = code.generate(build_dir + os.sep)
+                tmp_lib = os.path.join(build_dir, os.path.basename(lib_file))
+                compiler = os.environ.get('CC', 'cc')
+                subprocess.run([compiler, *self.codegen_flags, '-fPIC', '-shared', c_file, '-o', tmp_lib, '-lm'],
+                               check=True, capture_output=True)
+                os.replace(tmp_lib, lib_file)
+
+        return ca.nlpsol('mpc_solver', 'ipopt', lib_file, opts)
+
+    def solve_rebuild(self, ego_vehicle, surrounding_vehicles, sigmoid_barrier, decision_maker, y_ref, v_des, delta, eta):
+        """Solve the MPC problem by rebuilding the Opti graph from scratch (reference path)"""
         # Initialize optimization problem
         self.opti = ca.Opti()
         self.setup_optimizer()
@@ -160,9 +772,6 @@ class MPC:
             # Slip angle constraint (Eq. 21)
             self.opti.subject_to(self.v_y[i] >= -self.v_x[i] * self.beta_max)
             self.opti.subject_to(self.v_y[i] <= self.v_x[i] * self.beta_max)
-            
-            # Get activation signals from decision maker
-            delta, eta, _ = decision_maker.determine_activation_signals(ego_vehicle, surrounding_vehicles)
         
             for j, veh in enumerate(surrounding_vehicles):
                 # Sigmoid barrier constraints
@@ -0,0 +1,152 @@
+from Scenarios import setup_scenario
+from Env import Environment
+from Utils import SigmoidBarrier
+from Fsm import DecisionMaking
+from Mpc_Controller import MPC
+from Vehicle_Dynamics import TrafficState
+from Spatial_Index import SpatialIndex
+from Profiler import Profiler
+import numpy as np
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+class Agent:
+    def __init__(self, y_ref, v_des, dt=0.2, mpc=None, decision_maker=None):
+        """MPC-controlled vehicle with its own decision maker, barrier and controller"""
+        self.y_ref = y_ref  # Reference lane center
+        self.v_des = v_des  # Desired velocity
+        self.mpc = mpc if mpc else MPC(dt=dt)
+        self.decision_maker = decision_maker if decision_maker else DecisionMaking(TTC=2, TIV=4)
+        self.sigmoid_barrier = SigmoidBarrier()
+        self.vehicle = None  # Column view into the world state, set by MultiAgentSimulation
+        self.obstacles = []  # Every other vehicle of the world
+
+    def plan(self, obstacles, index):
+        """
+        Decision and MPC solve for the current (read-only) world state.
+        Returns (a_ex, a_ey, fsm_state, decision_time, solve_time).
+        """
+        self.sigmoid_barrier.optimize_zeta(self.vehicle.state[2])
+
+        t_start = time.perf_counter()
+        # The agent's own column never matches the FSM predicates (they all need delta_x != 0
+        # or a lateral offset), so the index over the whole world can be used directly
+        delta, eta, fsm_state = self.decision_maker.determine_activation_signals(self.vehicle, obstacles,
+                                                                                index=index)
+        decision_time = time.perf_counter() - t_start
+
+        t_start = time.perf_counter()
+        a_ex, a_ey, _ = self.mpc.solve(self.vehicle, obstacles, self.sigmoid_barrier, self.decision_maker,
+                                       self.y_ref, self.v_des, signals=(delta, eta))
+        solve_time = time.perf_counter() - t_start
+
+        # Apply control inputs with anti-windup
+        a_ex = np.clip(a_ex, self.mpc.a_ex_min, self.mpc.a_ex_max)
+        a_ey = np.clip(a_ey, self.mpc.a_ey_min, self.mpc.a_ey_max)
+        return a_ex, a_ey, fsm_state, decision_time, solve_time
+
+class MultiAgentSimulation:
+    def __init__(self, world, agents, dt=0.2, sim_time=30, environment=None, workers=None, profiler=None):
+        """
+        Several MPC agents on the same road. world is a TrafficState with every vehicle;
+        agents[k] drives column k, the remaining columns keep their constant accelerations.
+
+        Every step is synchronous: all agents plan on the same world state (in parallel on a
+        thread pool with `workers` threads, CasADi releases the GIL while solving), and the
+        commands are applied together once all plans are in. The result does not depend on
+        the number of threads or on their scheduling.
+        """
+        self.dt = dt
+        self.sim_time = sim_time
+        self.environment = environment if environment else Environment()
+        self.world = world
+        self.agents = list(agents)
+        self.workers = workers
+        self.spatial_index = SpatialIndex(world, bucket_width=self.environment.lane_width,
+                                          y_origin=self.environment.y_min)
+        self.profiler = profiler if profiler else Profiler(enabled=False)
+
+        # Each agent sees every vehicle except itself
+        for k, agent in enumerate(self.agents):
+            agent.vehicle = world.vehicles[k]
+            agent.obstacles = [vehicle for j, vehicle in enumerate(world.vehicles) if j != k]
+            agent.mpc.profiler = agent.decision_maker.profiler = self.profiler
+
+        self.time = 0
+        self.time_history = []
+        self.fsm_state_history = []   # Per step, one FSM state per agent
+        self.decision_time_history = []  # (steps, agents)
+        self.solve_time_history = []     # (steps, agents)
+        self.step_time_history = []      # Wall time of each synchronous step
+
+    @classmethod
+    def from_scenario(cls, scenario_num, agent_ids=('ego',), **kwargs):
+        """
+        Build a multi-agent run from a scenario of Scenarios.setup_scenario. The vehicles in
+        agent_ids become MPC agents that keep their initial lane and speed; the ego keeps its
+        reference lane and 30 m/s desired speed.
+        """
+        ego, others = setup_scenario(types.SimpleNamespace(), scenario_num)
+        vehicles = {vehicle.id: vehicle for vehicle in [ego] + others.vehicles}
+        order = list(agent_ids) + [veh_id for veh_id in vehicles if veh_id not in agent_ids]
+        world = TrafficState.from_vehicles([vehicles[veh_id] for veh_id in order])
+
+        dt = kwargs.get('dt', 0.2)
+        environment = kwargs.setdefault('environment', Environment())
+        agents = []
+        for veh_id in agent_ids:
+            state = vehicles[veh_id].state
+            if veh_id == 'ego':
+                agents.append(Agent(environment.get_lane_center(lane_idx=0), 30, dt=dt))
+            else:
+                agents.append(Agent(state[1], state[2], dt=dt))
+        return cls(world, agents, **kwargs)
+
+    def step(self, pool=None):
+        """One synchronous step: plan all agents on the current world state, then advance everything"""
+        profiler = self.profiler
+        with profiler.span('plan'):
+            if pool is None:
+                plans = [agent.plan(agent.obstacles, self.spatial_index) for agent in self.agents]
+            else:
+                # Barrier: map returns once every agent has planned, in agent order
+                plans = list(pool.map(lambda agent: agent.plan(agent.obstacles, self.spatial_index), self.agents))
+
+        with profiler.span('vehicle_update'):
+            a_x = self.world.ax.copy()
+            a_y = self.world.ay.copy()
+            for k, (a_ex, a_ey, _, _, _) in enumerate(plans):
+                a_x[k], a_y[k] = a_ex, a_ey
+            self.world.update(self.dt, a_x, a_y)
+            self.spatial_index.update()
+
+        self.fsm_state_history.append([plan[2] for plan in plans])
+        self.decision_time_history.append([plan[3] for plan in plans])
+        self.solve_time_history.append([plan[4] for plan in plans])
+
+    def run(self, visualize=False, verbose=True):
+        """Run all agents for sim_time seconds"""
+        num_steps = int(self.sim_time / self.dt)
+        workers = len(self.agents) if self.workers is None else self.workers
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for step in range(num_steps):
+                self.time = step * self.dt
+                t_start = time.perf_counter()
+                with self.profiler.span('step', step=step):
+                    self.step(pool)
+                self.step_time_history.append(time.perf_counter() - t_start)
+                self.time_history.append(self.time)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if visualize:
+            self.environment.visualize(vehicles=self.world.vehicles)
+
+        if verbose:
+            step_time = np.array(self.step_time_history)
+            print(f"Multi-agent simulation completed after {self.time:.2f}s with {len(self.agents)} agents")
+            print(f"Mean step time: {1e3 * step_time.mean():.3f} ms, "
+                  f"throughput: {len(self.agents) / step_time.mean():.1f} agent solves/s")
@@ -1,15 +1,16 @@
-import numpy as np
 import matplotlib.pyplot as plt
+from Env import Environment
+from Logger import load_log
 
-def plot_simulation_results(log_file='simulation_data.npz'):
-    # Load saved data
-    data = np.load(log_file, allow_pickle=True)
+def plot_simulation_results(log_dir='simulation_log'):
+    # Load saved data (memory-mapped)
+    data = load_log(log_dir)
     time = data['time']
     ego_y = data['ego_y']
     ego_vx = data['ego_vx']
     ego_ax = data['ego_ax']
     ego_ay = data['ego_ay']
-    vehicles = data['vehicles'].item()
+    vehicles = data['vehicles']  # [step, vehicle, state]
     
     # Create figure with subplots
     plt.figure(figsize=(12, 6))
@@ -17,8 +18,8 @@ def plot_simulation_results(log_file='simulation_data.npz'):
     # Plot trajectory (Y position vs Time)
     plt.subplot(2, 2, 1)
     plt.plot(time, ego_y, label='Ego Vehicle', linestyle='-')
-    for veh_id, veh_data in vehicles.items():
-            plt.plot(time, veh_data['y'], label=f'{veh_id}', linestyle='-')
+    for j, veh_id in enumerate(data['vehicle_ids']):
+        plt.plot(time, vehicles[:, j, 1], label=f'{veh_id}', linestyle='-')
     plt.xlabel('Time (s)')
     plt.ylabel('Lateral [y] Position (m)')
     plt.title('Vehicle Trajectories')
@@ -28,8 +29,8 @@ def plot_simulation_results(log_file='simulation_data.npz'):
     # Plot velocity profile
     plt.subplot(2, 2, 2)
     plt.plot(time, ego_vx, label='Ego Vehicle', linestyle='-')
-    for veh_id, veh_data in vehicles.items():
-        plt.plot(time, veh_data['vx'], label=f'{veh_id}', linestyle='-')
+    for j, veh_id in enumerate(data['vehicle_ids']):
+        plt.plot(time, vehicles[:, j, 2], label=f'{veh_id}', linestyle='-')
     plt.xlabel('Time (s)')
     plt.ylabel('v_x (m/s)')
     plt.title('Longitudinal Velocity Profiles')
@@ -55,6 +56,13 @@ def plot_simulation_results(log_file='simulation_data.npz'):
     plt.legend()
     
     plt.tight_layout()
+
+    # Barrier curves of every step over the x positions around the ego vehicle
+    if data['barrier_grid'] is not None:
+        x = data['ego_x'][:, None] + data['barrier_grid']
+        safety_barriers = {veh_id: (x, data['barriers'][:, j]) for j, veh_id in enumerate(data['vehicle_ids'])}
+        Environment().visualize(safety_barriers=safety_barriers)
+
     plt.show()
 
 if __name__ == "__main__":
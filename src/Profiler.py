@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+import numpy as np
+
+class Span:
+    def __init__(self, profiler, name, category, args):
+        """Timed region recorded by a Profiler when the with-block exits"""
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        """Attach values (e.g. solver stats) to the span"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.profiler.events.append((self.name, self.category, self.start, end - self.start,
+                                     threading.get_ident(), self.args))
+        return False
+
+class NullSpan:
+    """Span of a disabled profiler: does nothing"""
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Profiler:
+    def __init__(self, enabled=True):
+        """
+        Collects timed spans and counter samples. A disabled profiler hands out one shared
+        no-op span and ignores counters, so instrumented code costs a method call per span.
+        """
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.events = []    # (name, category, start, duration, thread id, args)
+        self.counters = []  # (name, time, value)
+
+    def span(self, name, category='sim', **args):
+        """Context manager timing the enclosed block as one span"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def count(self, name, value):
+        """Record one sample of a counter (e.g. solver iterations)"""
+        if self.enabled:
+            self.counters.append((name, time.perf_counter(), value))
+
+    def reset(self):
+        """Drop all recorded spans and counters"""
+        self.origin = time.perf_counter()
+        self.events = []
+        self.counters = []
+
+    def durations(self, name):
+        """Durations [s] of all spans with this name"""
+        return np.array([event[3] for event in self.events if event[0] == name])
+
+    def summary(self):
+        """Per-span statistics: {name: {'count', 'total', 'mean', 'p50', 'p95', 'p99'}} in seconds"""
+        names = list(dict.fromkeys(event[0] for event in self.events))
+        stats = {}
+        for name in names:
+            durations = self.durations(name)
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+            stats[name] = {'count': len(durations), 'total': durations.sum(), 'mean': durations.mean(),
+                           'p50': p50, 'p95': p95, 'p99': p99}
+        return stats
+
+    def report(self):
+        """Summary table of the spans in milliseconds"""
+        lines = [f"{'span':<22} {'count':>6} {'total ms':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<22} {s['count']:>6} {1e3 * s['total']:>10.1f} {1e3 * s['p50']:>8.3f} "
+                         f"{1e3 * s['p95']:>8.3f} {1e3 * s['p99']:>8.3f}")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path):
+        """Write the spans and counters as Chrome trace events (chrome://tracing, Perfetto)"""
+        trace = []
+        for name, category, start, duration, tid, args in self.events:
+            trace.append({'name': name, 'cat': category, 'ph': 'X', 'pid': 0, 'tid': tid,
+                          'ts': 1e6 * (start - self.origin), 'dur': 1e6 * duration,
+                          'args': {key: to_json(value) for key, value in args.items()}})
+        for name, t, value in self.counters:
+            trace.append({'name': name, 'ph': 'C', 'pid': 0, 'ts': 1e6 * (t - self.origin),
+                          'args': {name: to_json(value)}})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+def to_json(value):
+    """Plain Python value for the trace file (numpy scalars are not JSON serializable)"""
+    return value.item() if isinstance(value, np.generic) else value
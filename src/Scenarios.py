@@ -1,8 +1,114 @@
-from Vehicle_Dynamics import Vehicle
+import json
+import os
+import numpy as np
+
+from Vehicle_Dynamics import Vehicle, TrafficState
 from Env import Environment
 
-def setup_scenario(self, scenario_num):
-    """Set up a specific scenario based on Table II in the paper"""
+# State fields of a vehicle entry in a scenario spec, in state order
+STATE_FIELDS = ('x', 'y', 'vx', 'vy', 'ax', 'ay')
+
+def load_scenario(source):
+    """Scenario spec from a dict or a .json / .yaml file (YAML needs PyYAML)"""
+    if isinstance(source, dict):
+        return source
+    with open(source) as f:
+        if os.path.splitext(source)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML scenarios need PyYAML (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def entry_state(entry, env):
+    """State [x, y, v_x, v_y, a_x, a_y] of a vehicle entry; 'lane' (an index into env's lanes) may replace 'y'"""
+    state = [float(entry.get(field, 0.0)) for field in STATE_FIELDS]
+    if 'y' not in entry:
+        state[1] = env.get_lane_center(int(entry.get('lane', 0)))
+    return state
+
+def generate_traffic(env, density=20.0, x_range=(-200.0, 1000.0), lanes=None, speed_mean=28.0, speed_std=3.0,
+                     min_gap=10.0, clearance=30.0, ego_x=0.0, length=1.0, width=0.5, vx_max=40.0, seed=0):
+    """
+    Random traffic as TrafficState columns (states, length, width, vx_max, ids 'car1'...).
+    Every lane (default all lanes of env) gets density vehicles per km over x_range, with
+    gaps of min_gap [m] plus an exponential part, at constant speeds drawn from a normal
+    distribution clipped to [0, vx_max]. Vehicles within clearance [m] of ego_x are left out.
+    """
+    mean_gap = 1000.0 / density
+    if mean_gap <= min_gap:
+        raise ValueError(f"density {density}/km leaves no room above min_gap={min_gap} m")
+    rng = np.random.default_rng(seed)
+    lanes = range(env.num_lanes) if lanes is None else lanes
+    x_lo, x_hi = x_range
+    expected = (x_hi - x_lo) / mean_gap
+    count = int(expected + 5 * np.sqrt(expected)) + 10  # Enough gaps to cover x_range
+
+    x, y = [], []
+    for lane in lanes:
+        lane_x = x_lo + np.cumsum(min_gap + rng.exponential(mean_gap - min_gap, count))
+        lane_x = lane_x[lane_x <= x_hi]
+        x.append(lane_x)
+        y.append(np.full(len(lane_x), env.get_lane_center(lane)))
+    x, y = np.concatenate(x), np.concatenate(y)
+    keep = np.abs(x - ego_x) > clearance
+    x, y = x[keep], y[keep]
+
+    n = len(x)
+    states = np.zeros((6, n))
+    states[0], states[1] = x, y
+    states[2] = np.clip(rng.normal(speed_mean, speed_std, n), 0.0, vx_max)
+    return {'states': states, 'length': np.full(n, float(length)), 'width': np.full(n, float(width)),
+            'vx_max': np.full(n, float(vx_max)), 'ids': [f'car{k}' for k in range(1, n + 1)]}
+
+def build_scenario(spec, env=None, **traffic_kwargs):
+    """
+    Ego Vehicle and TrafficState of a declarative scenario spec:
+    {'ego': {...}, 'vehicles': [{...}, ...], 'traffic': {generate_traffic arguments}}.
+    An optional 'mpc' section holds MPC keyword arguments and is read by setup_scenario.
+    Entries give the state fields of STATE_FIELDS (default 0, 'lane' may replace 'y') and
+    optionally 'id', 'length', 'width' and 'vx_max'. The ego defaults to lane 0 at 25 m/s.
+    Non-ego vehicles go straight into the TrafficState columns (traffic_kwargs are passed on),
+    so no per-vehicle objects are built for generated traffic.
+    """
+    env = env if env else Environment()
+    ego_entry = {'lane': 0, 'vx': 25.0, **spec.get('ego', {})}
+    ego = Vehicle(entry_state(ego_entry, env), length=ego_entry.get('length', 1), width=ego_entry.get('width', 0.5),
+                  id='ego', vx_max=ego_entry.get('vx_max', 40.0))
+
+    entries = spec.get('vehicles', [])
+    states = np.array([entry_state(entry, env) for entry in entries]).T.reshape(6, len(entries))
+    length = [entry.get('length', 1.0) for entry in entries]
+    width = [entry.get('width', 0.5) for entry in entries]
+    vx_max = [entry.get('vx_max', 40.0) for entry in entries]
+    ids = [str(entry.get('id', f'veh{k}')) for k, entry in enumerate(entries, 1)]
+    if 'traffic' in spec:
+        traffic = generate_traffic(env, ego_x=ego.state[0], **spec['traffic'])
+        states = np.hstack([states, traffic['states']])
+        length = np.append(length, traffic['length'])
+        width = np.append(width, traffic['width'])
+        vx_max = np.append(vx_max, traffic['vx_max'])
+        ids = ids + traffic['ids']
+    return ego, TrafficState(states, length=length, width=width, ids=ids, vx_max=vx_max, **traffic_kwargs)
+
+def setup_scenario(self, scenario_num, **traffic_kwargs):
+    """
+    Set up a specific scenario based on Table II in the paper (scenario_num 1, 2 or 3), or a
+    declarative scenario (a spec dict or a .json / .yaml file, see build_scenario).
+    Returns the ego Vehicle and a TrafficState of the other vehicles (traffic_kwargs are
+    passed to it). The MPC keyword arguments of a spec's 'mpc' section are stored in
+    self.scenario_mpc.
+    """
+    self.scenario_mpc = {}  # MPC options of a declarative scenario ('mpc' section)
+    if not isinstance(scenario_num, (int, np.integer)):
+        env = getattr(self, 'environment', None)
+        spec = load_scenario(scenario_num)
+        self.scenario_mpc = dict(spec.get('mpc', {}))
+        self.ego_vehicle, traffic = build_scenario(spec, env, **traffic_kwargs)
+        self.surrounding_vehicles = traffic.vehicles
+        return self.ego_vehicle, traffic
+
     # Reset vehicles
     self.surrounding_vehicles = []
     
@@ -93,4 +199,5 @@ def setup_scenario(self, scenario_num):
         veh2_a_y = 0
         self.surrounding_vehicles.append(Vehicle([veh2_x, veh2_y, veh2_v_x, veh2_v_y, veh2_a_x, veh2_a_y], id='veh2'))
 
-    return self.ego_vehicle, self.surrounding_vehicles
\ No newline at end of file
+    traffic = TrafficState.from_vehicles(self.surrounding_vehicles, **traffic_kwargs)
+    return self.ego_vehicle, traffic
\ No newline at end of file
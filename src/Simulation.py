@@ -3,92 +3,437 @@ from Env import Environment
 from Utils import SigmoidBarrier
 from Fsm import DecisionMaking
 from Mpc_Controller import MPC
+from Vehicle_Dynamics import TrafficState, TrajectoryStore, integrate_point_mass
+from Spatial_Index import SpatialIndex
+from Logger import SimulationLogger
+from Profiler import Profiler
 import numpy as np
+import copy
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+def logged(name):
+    """Read-only view of a logged signal for the steps run so far"""
+    return property(lambda self: self.logger.get(name))
 
 class Simulation:
-    def __init__(self, dt=0.2, sim_time=30, environment=None, scenario_num=1):
-        """Initialize simulation with time step and duration"""
+    # Logged histories (views into the logger buffers or memory-mapped log files)
+    time_history = logged('time')
+    ego_y_history = logged('ego_y')
+    ego_vx_history = logged('ego_vx')
+    ego_ax_history = logged('ego_ax')
+    ego_ay_history = logged('ego_ay')
+    decision_time_history = logged('decision_time')
+    solve_time_history = logged('solve_time')
+    vehicle_states_history = logged('vehicles')  # [step, vehicle, state]
+    barrier_history = logged('barriers')  # [step, vehicle, point], barrier curves over barrier_grid
+    fsm_state_history = property(lambda self: self.logger.get_fsm_states())
+
+    def __init__(self, dt=0.2, sim_time=30, environment=None, scenario_num=1, profiler=None,
+                 control_latency=None, plant_dt=None, trajectory_retention=None, trajectory_decimation=1,
+                 terminate_when=(), cruise_window=None, cruise_max_age=5, log_barriers=True,
+                 mpc_kwargs=None):
+        """
+        Initialize simulation with time step and duration. scenario_num is a Table II scenario
+        number or a declarative scenario (spec dict or .json / .yaml file, see Scenarios.py).
+        dt is the control period; the plant is integrated with plant_dt (default dt), which
+        must divide dt. The command is held between solves (zero-order hold), and trajectories
+        record every plant step while the logger records every control step. For long runs,
+        trajectory_decimation keeps every n-th plant step and trajectory_retention only the
+        last that many kept states of every trajectory (see TrajectoryStore).
+        profiler is an optional Profiler collecting per-phase spans of run().
+
+        control_latency selects the controller pipeline:
+        None solves synchronously and applies the command in the same step.
+        A number of seconds runs the solve in a background worker and applies its
+        command once that much simulated time has passed (rounded up to a step).
+        'measured' does the same with the measured solve time as the latency; the plant
+        then never waits longer than one step of wall time for a running solve.
+        In both asynchronous modes the previous command is held until the new one arrives,
+        and the next solve starts from the state at the step the command is applied.
+
+        terminate_when is a list of predicates (see Termination.py) evaluated after every
+        step; the first one that holds ends the run and is recorded in self.termination.
+        With a cruise_window [m], synchronous steps in Lane Keeping without any vehicle within
+        that distance of the ego reuse the last plan shifted by one step instead of solving,
+        for at most cruise_max_age steps in a row.
+
+        log_barriers logs the barrier curve of every surrounding vehicle over barrier_grid at
+        every step (for the plots); sweeps and benchmarks switch it off to save the
+        vehicles x grid points evaluated and stored per step.
+
+        mpc_kwargs are keyword arguments of the MPC (e.g. obstacle_range and
+        num_obstacle_slots for dense traffic). They override the 'mpc' section of a
+        declarative scenario.
+        """
         self.dt = dt
+        self.plant_dt = plant_dt if plant_dt else dt
+        self.num_substeps = int(round(dt / self.plant_dt))  # Plant steps per control step
+        if self.num_substeps < 1 or abs(self.num_substeps * self.plant_dt - dt) > 1e-9:
+            raise ValueError(f"plant_dt={self.plant_dt} does not divide the control period dt={dt}")
         self.sim_time = sim_time
         self.environment = environment if environment else Environment()
-        self.ego_vehicle, self.surrounding_vehicles = setup_scenario(self, scenario_num)
+        self.y_ref = self.environment.get_lane_center(lane_idx=0)  # Reference lane (right lane)
+        self.scenario_num = scenario_num
+        # Non-ego vehicles live in one structure-of-arrays container
+        self.ego_vehicle, traffic = setup_scenario(self, scenario_num, retention=trajectory_retention,
+                                                   decimation=trajectory_decimation)
+        self.ego_vehicle.trajectory_store = TrajectoryStore(self.ego_vehicle.state, trajectory_retention,
+                                                            trajectory_decimation)
+        self.set_traffic(traffic)
         self.sigmoid_barrier = SigmoidBarrier()
+        self.barrier_grid = np.linspace(-50, 150, 41)  # Ego x offsets [m] of the logged barrier curves
+        self.log_barriers = log_barriers
         self.decision_maker = DecisionMaking(TTC=2, TIV=4)
-        self.mpc = MPC(dt=dt)
+        self.mpc = MPC(dt=dt, **{**self.scenario_mpc, **(mpc_kwargs or {})})
+        self.logger = None
+        self.profiler = profiler if profiler else Profiler(enabled=False)
+        self.control_latency = control_latency
+        self.controller = None  # Background solve worker in the asynchronous modes
+        self.pending = None     # Solve in flight: future, start step, sample time, wall start time
+        self.command = (self.ego_vehicle.state[4], self.ego_vehicle.state[5])  # Held acceleration command
+        self.command_time = 0.0  # Time of the state the held command was computed from
         self.time = 0
-                
-    def run(self, visualize=True):
-        """Run the simulation"""
-        print(f"Starting simulation...")
+        self.next_step = 0          # First control step of the next run() (set by restore)
+        self.restored_log = None    # Logged steps of a restored checkpoint, copied into the next logger
+        self.checkpoints = {}       # step -> snapshot taken by run(checkpoint_steps=...)
+        self.terminate_when = list(terminate_when)
+        self.termination = None     # {'reason', 'step', 'time'} of an early end of the run
+        self.cruise_window = cruise_window
+        self.cruise_max_age = cruise_max_age
+
+    def set_traffic(self, traffic):
+        """Replace the surrounding vehicles by a TrafficState, with their vehicle views and spatial index"""
+        self.traffic = traffic
+        self.surrounding_vehicles = traffic.vehicles
+        self.spatial_index = SpatialIndex(traffic, bucket_width=self.environment.lane_width,
+                                          y_origin=self.environment.y_min)
+
+    @classmethod
+    def from_checkpoint(cls, snapshot, mpc=None, **kwargs):
+        """
+        Simulation of the checkpoint's scenario and rates, restored from it. mpc replaces the
+        default controller before its warm start is restored; kwargs as for __init__ (e.g. sim_time).
+        """
+        sim = cls(dt=snapshot['dt'], plant_dt=snapshot['plant_dt'], scenario_num=snapshot['scenario_num'], **kwargs)
+        if mpc is not None:
+            sim.mpc = mpc
+        sim.restore(snapshot)
+        return sim
+
+    def run(self, visualize=True, log_dir='simulation_log', verbose=True, chunk_size=256, checkpoint_steps=()):
+        """
+        Run the simulation. Logged signals are streamed to one .npy file per signal
+        in log_dir, chunk_size steps at a time (log_dir=None keeps them in memory only).
+        A snapshot is stored in self.checkpoints before every step of checkpoint_steps
+        (num_steps for the state after the last step). After restore() the run continues
+        at the checkpoint's step.
+        """
+        if verbose:
+            print(f"Starting simulation...")
         
         # Reference lane and desired velocity
-        y_ref = self.environment.get_lane_center(lane_idx=0)  # Right lane
+        y_ref = self.y_ref
         v_des = 30  # m/s
         
         # Number of time steps
         num_steps = int(self.sim_time / self.dt)
-        
-        # Initialize data logging
-        self.time_history = []
-        self.ego_y_history = []
-        self.ego_vx_history = []
-        self.ego_ax_history = []
-        self.ego_ay_history = []
-        self.vehicles_history = {veh.id: {'y': [], 'vx': []} for veh in self.surrounding_vehicles}
-        
-        # Initial optimization of sigmoid barrier parameter
-        self.sigmoid_barrier.optimize_zeta(self.ego_vehicle.state[2])
-        
-        for step in range(num_steps):
-            self.time = step * self.dt
 
+        # Share the profiler with the controller and the decision maker
+        profiler = self.profiler
+        self.mpc.profiler = profiler
+        self.decision_maker.profiler = profiler
+
+        with profiler.span('setup'):
+            # Initialize data logging
+            self.logger = SimulationLogger(num_steps, self.traffic.ids, log_dir=log_dir,
+                                           chunk_size=chunk_size, dt=self.dt,
+                                           barrier_grid=self.barrier_grid if self.log_barriers else None,
+                                           ego_size=(self.ego_vehicle.length, self.ego_vehicle.width),
+                                           vehicle_sizes=np.column_stack([self.traffic.length, self.traffic.width]),
+                                           road=(self.environment.y_min, self.environment.y_max))
+            if self.restored_log is not None:
+                self.logger.restore(self.restored_log)
+                self.restored_log = None
+
+            # Initial optimization of sigmoid barrier parameter
+            self.sigmoid_barrier.optimize_zeta(self.ego_vehicle.state[2])
+        
+        if self.control_latency is not None:
+            self.controller = ThreadPoolExecutor(max_workers=1)
+        checkpoint_steps = set(checkpoint_steps)
+        try:
+            for step in range(self.next_step, num_steps):
+                if step in checkpoint_steps:
+                    self.checkpoints[step] = self.checkpoint()
+                with profiler.span('step', step=step):
+                    self.step(step, y_ref, v_des)
+                self.next_step = step + 1
+                if self.terminate_when and self.check_termination(step):
+                    break
+            if self.next_step in checkpoint_steps:
+                self.checkpoints[self.next_step] = self.checkpoint()
+        finally:
+            if self.controller is not None:
+                self.controller.shutdown(wait=True)
+                self.controller = None
+                self.pending = None
             
-            for veh in self.surrounding_vehicles:
-                self.vehicles_history[veh.id]['y'].append(veh.state[1])
-                self.vehicles_history[veh.id]['vx'].append(veh.state[2])
+        # Flush the remaining logged steps
+        with profiler.span('logging'):
+            self.logger.close()
+
+        # Visualize if required
+        if visualize:
+            with profiler.span('visualize'):
+                self.environment.visualize(vehicles=self.surrounding_vehicles + [self.ego_vehicle],
+                                           safety_barriers=self.safety_barriers())
                 
-            # Update sigmoid barrier parameter
+        if verbose:
+            print(f"Simulation completed after {self.time:.2f}s")
+            if self.termination is not None:
+                print(f"Terminated early: {self.termination['reason']} at step {self.termination['step']}")
+            print(f"Mean decision time: {1e3 * np.mean(self.decision_time_history):.3f} ms/step, "
+                  f"mean solve time: {1e3 * np.mean(self.solve_time_history):.3f} ms/step")
+            counters = self.mpc.counters
+            fallbacks = counters['feasible_iterate'] + counters['shifted_plan'] + counters['emergency_brake']
+            if self.mpc.time_budget is not None or fallbacks:
+                print(f"Deadline misses: {counters['deadline_misses']}, fallbacks: "
+                      f"{counters['feasible_iterate']} feasible iterate, {counters['shifted_plan']} shifted plan, "
+                      f"{counters['emergency_brake']} emergency brake")
+            if self.control_latency is not None:
+                solve_time = self.solve_time_history[self.solve_time_history > 0]
+                print(f"Mean command delay: {1e3 * np.mean(self.logger.get('command_delay')):.1f} ms, "
+                      f"{len(solve_time)} commands applied, {1e3 * np.mean(solve_time):.3f} ms/solve")
+            if profiler.enabled:
+                print(profiler.report())
+
+    def check_termination(self, step):
+        """Evaluate the termination predicates after a step; returns whether one of them holds"""
+        with self.profiler.span('termination'):
+            for predicate in self.terminate_when:
+                if predicate(self):
+                    self.termination = {'reason': getattr(predicate, 'name', type(predicate).__name__),
+                                        'step': step, 'time': self.time}
+                    return True
+        return False
+
+    def road_clear(self):
+        """Whether no vehicle is within cruise_window [m] of the ego along x, on any lane"""
+        x = self.ego_vehicle.state[0]
+        env = self.environment
+        cols = self.spatial_index.candidates(x - self.cruise_window, x + self.cruise_window,
+                                             env.y_min - env.lane_width, env.y_max + env.lane_width)
+        return len(cols) == 0
+
+    def checkpoint(self):
+        """
+        Snapshot of the simulation between two control steps: vehicle states and trajectories,
+        FSM state, zeta, the MPC warm start and counters, the held command and the steps logged
+        so far. A Simulation of the same scenario and rates continues from it with restore()
+        and run() exactly as the uninterrupted run would (Checkpoint.save_checkpoint writes it
+        to disk). Not available while an asynchronous solve is in flight.
+        """
+        if self.pending is not None:
+            raise RuntimeError("Cannot checkpoint while a controller solve is in flight")
+        return {
+            'scenario_num': self.scenario_num, 'dt': self.dt, 'plant_dt': self.plant_dt,
+            'step': self.next_step, 'time': self.time,
+            'command': [float(a) for a in self.command], 'command_time': float(self.command_time),
+            'ego': self.ego_vehicle.snapshot(),
+            'traffic': self.traffic.snapshot(),
+            'spatial_index': self.spatial_index.snapshot(),
+            'decision_maker': self.decision_maker.snapshot(),
+            'sigmoid_barrier': self.sigmoid_barrier.snapshot(),
+            'mpc': self.mpc.snapshot(),
+            'logger': None if self.logger is None else self.logger.snapshot(),
+        }
+
+    def restore(self, snapshot):
+        """Return to a checkpoint() snapshot; the next run() continues at its step"""
+        if (snapshot['dt'], snapshot['plant_dt']) != (self.dt, self.plant_dt):
+            raise ValueError(f"Checkpoint rates dt={snapshot['dt']}, plant_dt={snapshot['plant_dt']} "
+                             f"do not match dt={self.dt}, plant_dt={self.plant_dt}")
+        self.ego_vehicle.restore(snapshot['ego'])
+        self.traffic.restore(snapshot['traffic'])
+        self.spatial_index.restore(snapshot['spatial_index'])
+        self.decision_maker.restore(snapshot['decision_maker'])
+        self.sigmoid_barrier.restore(snapshot['sigmoid_barrier'])
+        self.mpc.restore(snapshot['mpc'])
+        self.command = tuple(snapshot['command'])
+        self.command_time = snapshot['command_time']
+        self.time = snapshot['time']
+        self.next_step = int(snapshot['step'])
+        self.restored_log = snapshot['logger']
+
+    def step(self, step, y_ref, v_des):
+        """Advance the simulation by one control step: decision, MPC solve, vehicle update and logging"""
+        profiler = self.profiler
+        self.time = step * self.dt
+
+        # Update sigmoid barrier parameter
+        with profiler.span('zeta'):
             self.sigmoid_barrier.optimize_zeta(self.ego_vehicle.state[2])
-            
-            # Solve MPC
-            a_ex, a_ey, _ = self.mpc.solve(
+        
+        if self.control_latency is None:
+            decision_time, solve_time, fsm_state = self.control_step(y_ref, v_des)
+        else:
+            decision_time, solve_time, fsm_state = self.control_step_async(step, y_ref, v_des)
+
+        # Apply control inputs with anti-windup
+        a_ex = np.clip(self.command[0], self.mpc.a_ex_min, self.mpc.a_ex_max)
+        a_ey = np.clip(self.command[1], self.mpc.a_ey_min, self.mpc.a_ey_max)
+        
+        with profiler.span('vehicle_update'):
+            self.integrate_plant(a_ex, a_ey)
+
+        barriers = None
+        if self.log_barriers:
+            with profiler.span('barriers'):
+                barriers = self.barrier_curves()
+
+        with profiler.span('logging'):
+            self.logger.log_step(self.time, self.ego_vehicle.state, self.traffic.states,
+                                 fsm_state, decision_time, solve_time, self.time - self.command_time, barriers)
+
+    def barrier_curves(self):
+        """
+        Barrier curves (y of every surrounding vehicle plus its sigmoid barrier) over the ego
+        positions ego x + barrier_grid, for the current state and lane change signal.
+        Shape (vehicles, grid points).
+        """
+        ego = self.ego_vehicle.state
+        offsets = self.sigmoid_barrier.barrier_curves(ego[0] + self.barrier_grid, self.traffic.x,
+                                                      self.decision_maker.TIV * ego[2], self.decision_maker.delta)
+        return self.traffic.y[:, None] + offsets[:, 0]
+
+    def safety_barriers(self):
+        """Logged barrier curves as {vehicle id: (x, y)}, one row per step (Environment.visualize); None if not logged"""
+        if not self.log_barriers:
+            return None
+        x = self.logger.get('ego_x')[:, None] + self.barrier_grid
+        curves = self.barrier_history
+        return {veh_id: (x, curves[:, j]) for j, veh_id in enumerate(self.traffic.ids)}
+
+    def control_step(self, y_ref, v_des):
+        """Synchronous decision and MPC solve; returns (decision time, solve time, FSM state)"""
+        profiler = self.profiler
+
+        # Decision stage: evaluate the FSM once per control step
+        t_start = time.perf_counter()
+        with profiler.span('decision'):
+            delta, eta, fsm_state = self.decision_maker.determine_activation_signals(
                 self.ego_vehicle,
                 self.surrounding_vehicles,
-                self.sigmoid_barrier,
-                self.decision_maker,
-                y_ref,
-                v_des
+                index=self.spatial_index
             )
+        decision_time = time.perf_counter() - t_start
 
-            # Apply control inputs with anti-windup
-            a_ex = np.clip(a_ex, self.mpc.a_ex_min, self.mpc.a_ex_max)
-            a_ey = np.clip(a_ey, self.mpc.a_ey_min, self.mpc.a_ey_max)
-            
-            # Update ego vehicle
-            self.ego_vehicle.update(a_ex, a_ey, self.dt)
-            
-            # Update surrounding vehicles
-            for vehicle in self.surrounding_vehicles:
-                veh_a_x, veh_a_y = vehicle.state[4], vehicle.state[5]
-                vehicle.update(veh_a_x, veh_a_y, self.dt)
-
-            self.time_history.append(self.time)
-            self.ego_y_history.append(self.ego_vehicle.state[1])
-            self.ego_vx_history.append(self.ego_vehicle.state[2])
-            self.ego_ax_history.append(self.ego_vehicle.state[4])
-            self.ego_ay_history.append(self.ego_vehicle.state[5])
-            
-        # Visualize if required
-        if visualize:
-            self.environment.visualize(vehicles=self.surrounding_vehicles + [self.ego_vehicle])
-
-         # Save data after simulation
-        np.savez('simulation_data.npz',
-                 time=np.array(self.time_history),
-                 ego_y=np.array(self.ego_y_history),
-                 ego_vx=np.array(self.ego_vx_history),
-                 ego_ax=np.array(self.ego_ax_history),
-                 ego_ay=np.array(self.ego_ay_history),
-                 vehicles=self.vehicles_history)
-                
-        print(f"Simulation completed after {self.time:.2f}s")
+        # Cruise: with nothing around in Lane Keeping the last plan is reused instead of solving
+        t_start = time.perf_counter()
+        plan = None
+        if self.cruise_window is not None and fsm_state == "Lane Keeping" and self.road_clear():
+            with profiler.span('cruise'):
+                plan = self.mpc.reuse_plan(self.cruise_max_age)
+
+        # Solve MPC
+        if plan is not None:
+            a_ex, a_ey = plan
+        else:
+            with profiler.span('mpc_solve'):
+                a_ex, a_ey, _ = self.mpc.solve(
+                    self.ego_vehicle,
+                    self.surrounding_vehicles,
+                    self.sigmoid_barrier,
+                    self.decision_maker,
+                    y_ref,
+                    v_des,
+                    signals=(delta, eta),
+                    index=self.spatial_index
+                )
+        solve_time = time.perf_counter() - t_start
+
+        self.command = (a_ex, a_ey)
+        self.command_time = self.time
+        return decision_time, solve_time, fsm_state
+
+    def control_step_async(self, step, y_ref, v_des):
+        """
+        Asynchronous pipeline: apply the command of the solve in flight if it is available
+        at this step, then start the next solve from the current state when the worker is free.
+        Returns (decision time, solve time of the command applied at this step, FSM state).
+        """
+        solve_time = self.poll_solve(step)
+        decision_time = 0.0
+        if self.pending is None:
+            decision_time = self.start_solve(step, y_ref, v_des)
+            # A zero latency makes the new command available at this step already
+            if self.control_latency != 'measured' and self.control_latency <= 0:
+                solve_time = self.poll_solve(step)
+        return decision_time, solve_time, self.decision_maker.current_state
+
+    def poll_solve(self, step):
+        """Take over the command of the solve in flight if it is available at this step; returns its solve time"""
+        pending = self.pending
+        if pending is None:
+            return 0.0
+        elapsed = (step - pending['step']) * self.dt
+        if self.control_latency == 'measured':
+            # Wall time may not run ahead of simulated time while waiting for the solve
+            timeout = pending['wall_start'] + elapsed - time.perf_counter()
+            done, _ = wait([pending['future']], timeout=max(timeout, 0.0))
+            ready = bool(done) and pending['future'].result()[2] <= elapsed
+        else:
+            ready = step >= pending['step'] + math.ceil(self.control_latency / self.dt - 1e-9)
+        if not ready:
+            return 0.0
+
+        a_ex, a_ey, solve_time = pending['future'].result()
+        self.command = (a_ex, a_ey)
+        self.command_time = pending['time']
+        self.pending = None
+        return solve_time
+
+    def start_solve(self, step, y_ref, v_des):
+        """Evaluate the FSM and submit an MPC solve on a copy of the current state; returns the decision time"""
+        t_start = time.perf_counter()
+        with self.profiler.span('decision'):
+            delta, eta, _ = self.decision_maker.determine_activation_signals(
+                self.ego_vehicle, self.surrounding_vehicles, index=self.spatial_index)
+        decision_time = time.perf_counter() - t_start
+
+        # The worker solves on copies, so the plant can advance meanwhile
+        ego = copy.copy(self.ego_vehicle)
+        ego.state = self.ego_vehicle.state.copy()
+        traffic = TrafficState(self.traffic.states.copy(), length=self.traffic.length,
+                               width=self.traffic.width, ids=self.traffic.ids, vx_max=self.traffic.vx_max)
+        index = SpatialIndex(traffic, bucket_width=self.spatial_index.bucket_width,
+                             y_origin=self.spatial_index.y_origin)
+        future = self.controller.submit(self.solve_snapshot, ego, traffic, index,
+                                        copy.copy(self.sigmoid_barrier), y_ref, v_des, (delta, eta))
+        self.pending = {'future': future, 'step': step, 'time': self.time, 'wall_start': time.perf_counter()}
+        return decision_time
+
+    def solve_snapshot(self, ego, traffic, index, sigmoid_barrier, y_ref, v_des, signals):
+        """MPC solve on a copy of the simulation state (runs in the controller worker)"""
+        t_start = time.perf_counter()
+        with self.profiler.span('mpc_solve'):
+            a_ex, a_ey, _ = self.mpc.solve(ego, traffic.vehicles, sigmoid_barrier, self.decision_maker,
+                                           y_ref, v_des, signals=signals, index=index)
+        return a_ex, a_ey, time.perf_counter() - t_start
+
+    def integrate_plant(self, a_ex, a_ey):
+        """
+        Advance the ego vehicle (held command) and the surrounding vehicles (their constant
+        accelerations) over one control period, in one batch over all vehicles and plant steps
+        """
+        ego = self.ego_vehicle
+        states = np.column_stack([ego.state, self.traffic.states])
+        states[4, 0], states[5, 0] = a_ex, a_ey
+        vx_max = np.append(ego.vx_max, self.traffic.vx_max)
+        path = integrate_point_mass(states, vx_max, self.plant_dt, self.num_substeps)
+
+        ego.set_path(path[:, :, 0])
+        self.traffic.set_path(path[:, :, 1:])
+        self.spatial_index.update()
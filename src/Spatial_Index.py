@@ -0,0 +1,90 @@
+import numpy as np
+
+class SpatialIndex:
+    def __init__(self, traffic, bucket_width=1.5, y_origin=0.0):
+        """
+        Lane-bucketed index of the vehicles in a TrafficState, sorted by x within each bucket.
+        Buckets are horizontal strips of height bucket_width starting at y_origin.
+        """
+        self.traffic = traffic
+        self.bucket_width = bucket_width
+        self.y_origin = y_origin
+        self.order = np.arange(len(traffic))  # Vehicle columns sorted by (bucket, x)
+        self.update()
+
+    def bucket_of(self, y):
+        """Bucket number of a lateral position (scalar or array)"""
+        return np.floor((np.asarray(y) - self.y_origin) / self.bucket_width).astype(np.int64)
+
+    def update(self):
+        """
+        Re-sort the index after the vehicles moved. The previous order is used as the
+        starting point, so the stable sorts run in near-linear time when few vehicles
+        overtake each other or change bucket between two steps.
+        """
+        x = self.traffic.x[self.order]
+        order = self.order[np.argsort(x, kind='stable')]
+        buckets = self.bucket_of(self.traffic.y[order])
+        by_bucket = np.argsort(buckets, kind='stable')
+        self.order = order[by_bucket]
+        self.sorted_buckets = buckets[by_bucket]
+        self.sorted_x = self.traffic.x[self.order]
+
+    def snapshot(self):
+        """Current sort order, the starting point of the next update"""
+        return {'order': self.order.copy()}
+
+    def restore(self, snapshot):
+        """Re-sort from the order of a snapshot (after the traffic states were restored)"""
+        self.order = np.array(snapshot['order'], dtype=np.int64)
+        self.update()
+
+    def bucket_slice(self, bucket):
+        """(start, stop) range of a bucket in the sorted arrays, found by binary search"""
+        start = np.searchsorted(self.sorted_buckets, bucket, side='left')
+        stop = np.searchsorted(self.sorted_buckets, bucket, side='right')
+        return start, stop
+
+    def buckets(self, y_lo, y_hi):
+        """Buckets overlapping [y_lo, y_hi], limited to the range of occupied buckets"""
+        if len(self.sorted_buckets) == 0:
+            return range(0)
+        lo = max(int(self.bucket_of(y_lo)), int(self.sorted_buckets[0]))
+        hi = min(int(self.bucket_of(y_hi)), int(self.sorted_buckets[-1]))
+        return range(lo, hi + 1)
+
+    def candidates(self, x_lo, x_hi, y_lo, y_hi):
+        """
+        Columns of all vehicles with x_lo <= x <= x_hi and y_lo <= y <= y_hi.
+        Only the buckets overlapping [y_lo, y_hi] are visited.
+        """
+        result = []
+        for bucket in self.buckets(y_lo, y_hi):
+            start, stop = self.bucket_slice(bucket)
+            lo = start + np.searchsorted(self.sorted_x[start:stop], x_lo, side='left')
+            hi = start + np.searchsorted(self.sorted_x[start:stop], x_hi, side='right')
+            cols = self.order[lo:hi]
+            y = self.traffic.y[cols]
+            result.append(cols[(y >= y_lo) & (y <= y_hi)])
+        return np.concatenate(result) if result else np.zeros(0, dtype=np.int64)
+
+    def nearest_ahead(self, x, y_lo, y_hi):
+        """Column of the closest vehicle with position strictly ahead of x and y_lo <= y <= y_hi, or None"""
+        best, best_x = None, np.inf
+        for bucket in self.buckets(y_lo, y_hi):
+            start, stop = self.bucket_slice(bucket)
+            k = start + np.searchsorted(self.sorted_x[start:stop], x, side='right')
+            # Walk forward until a vehicle inside the lateral range is found
+            while k < stop and self.sorted_x[k] < best_x:
+                col = self.order[k]
+                if y_lo <= self.traffic.y[col] <= y_hi:
+                    best, best_x = col, self.sorted_x[k]
+                    break
+                k += 1
+        return best
+
+    def within(self, x, y, radius):
+        """Columns of all vehicles within radius meters of (x, y)"""
+        cols = self.candidates(x - radius, x + radius, y - radius, y + radius)
+        dist = np.hypot(self.traffic.x[cols] - x, self.traffic.y[cols] - y)
+        return cols[dist <= radius]
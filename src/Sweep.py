@@ -0,0 +1,268 @@
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Simulation import Simulation
+from Mpc_Controller import MPC
+from Explicit_Mpc import ExplicitMPC
+from Checkpoint import save_checkpoint, load_checkpoint
+from Termination import default_predicates
+
+# Sweepable parameters: '<vehicle id>_<field>' for initial states (gap = x offset from the ego),
+# MPC weight names, and 'scenario'
+STATE_FIELDS = {'x': 0, 'y': 1, 'vx': 2, 'vy': 3, 'ax': 4, 'ay': 5}
+MPC_WEIGHTS = ('Q_lat', 'Q_vel', 'R_da_ex', 'R_da_ey', 'chi')
+
+# One warm MPC per worker process, keyed by its weights
+_worker_mpcs = {}
+# Checkpoints loaded by this worker process, keyed by path
+_worker_checkpoints = {}
+
+def grid_runs(grid):
+    """Parameter sets for the full cartesian product of grid = {name: [values]}"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def random_runs(distributions, num_runs, seed=0):
+    """
+    Parameter sets sampled from distributions = {name: spec}, where spec is
+    a (low, high) tuple for uniform sampling or a list of choices.
+    """
+    rng = np.random.default_rng(seed)
+    runs = [{} for _ in range(num_runs)]
+    for name in sorted(distributions):
+        spec = distributions[name]
+        if isinstance(spec, tuple):
+            values = rng.uniform(spec[0], spec[1], num_runs)
+        else:
+            values = rng.choice(spec, num_runs)
+        for run, value in zip(runs, values):
+            run[name] = value.item()
+    return runs
+
+def apply_parameters(sim, params, restart=True):
+    """
+    Overwrite initial states and MPC weights of a freshly built simulation, or with
+    restart=False perturb the current state of a restored one (its trajectories are kept)
+    """
+    for name, value in params.items():
+        if name == 'scenario':
+            continue
+        if name in MPC_WEIGHTS:
+            setattr(sim.mpc, name, value)
+            continue
+
+        owner, field = name.split('_', 1)
+        if owner == 'ego':
+            state = sim.ego_vehicle.state
+        elif owner in sim.traffic.index:
+            state = sim.traffic.states[:, sim.traffic.index[owner]]
+        else:
+            raise ValueError(f"Unknown sweep parameter: {name}")
+
+        if field == 'gap':
+            state[0] = sim.ego_vehicle.state[0] + value
+        elif field in STATE_FIELDS:
+            state[STATE_FIELDS[field]] = value
+        else:
+            raise ValueError(f"Unknown sweep parameter: {name}")
+
+    # Restart the recorded trajectories from the modified initial states
+    if restart:
+        sim.ego_vehicle.trajectory_store.reset(sim.ego_vehicle.state)
+        sim.traffic.history_store.reset(sim.traffic.states)
+    sim.spatial_index.update()
+
+def worker_mpc(params, dt, mpc_kwargs):
+    """MPC of this worker for the swept weights, reused across runs to keep its solver warm"""
+    key = tuple(params.get(name) for name in MPC_WEIGHTS)
+    if key not in _worker_mpcs:
+        # With a table_dir, the explicit-MPC table answers the covered steps (its dt is the table's)
+        mpc = ExplicitMPC(**mpc_kwargs) if 'table_dir' in mpc_kwargs else MPC(dt=dt, **mpc_kwargs)
+        for name in MPC_WEIGHTS:
+            if params.get(name) is not None:
+                setattr(mpc, name, params[name])
+        _worker_mpcs[key] = mpc
+    mpc = _worker_mpcs[key]
+    mpc.reset_warm_start()
+    mpc.reset_counters()
+    return mpc
+
+def worker_checkpoint(path):
+    """Snapshot of a checkpoint file, loaded once per worker (restoring copies it)"""
+    if path not in _worker_checkpoints:
+        _worker_checkpoints[path] = load_checkpoint(path)
+    return _worker_checkpoints[path]
+
+def summarize(sim, wall_time):
+    """Per-run summary metrics of a finished simulation"""
+    ego = sim.ego_vehicle
+    ego_traj = ego.trajectory          # (samples, 6)
+    traffic = sim.traffic.history      # (samples, 6, vehicles)
+
+    delta_x = traffic[:, 0, :] - ego_traj[:, 0:1]
+    delta_y = traffic[:, 1, :] - ego_traj[:, 1:2]
+    overlap_x = np.abs(delta_x) < (ego.length + sim.traffic.length) / 2
+    overlap_y = np.abs(delta_y) < (ego.width + sim.traffic.width) / 2
+    gaps = np.hypot(delta_x, delta_y)
+
+    jerk = np.hypot(np.diff(sim.ego_ax_history), np.diff(sim.ego_ay_history)) / sim.dt
+    solve_time = np.array(sim.solve_time_history)
+
+    return {
+        'collision': float(np.any(overlap_x & overlap_y)),
+        'min_gap': float(gaps.min()) if gaps.size else np.inf,
+        'max_jerk': float(jerk.max()) if jerk.size else 0.0,
+        'solve_p50': float(np.percentile(solve_time, 50)),
+        'solve_p95': float(np.percentile(solve_time, 95)),
+        'solve_p99': float(np.percentile(solve_time, 99)),
+        'mean_iter': float(np.mean(sim.mpc.iter_counts)) if sim.mpc.iter_counts else np.nan,
+        'deadline_misses': float(sim.mpc.counters['deadline_misses']),
+        'fallbacks': float(sum(sim.mpc.counters[name] for name in ('feasible_iterate', 'shifted_plan', 'emergency_brake'))),
+        'table_lookups': float(sim.mpc.counters.get('table_lookups', 0)),
+        'reused_plans': float(sim.mpc.counters.get('reused_plan', 0)),
+        'terminated': float(sim.termination is not None),
+        'end_time': float(sim.time),
+        'wall_time': wall_time,
+    }
+
+def run_one(run_id, params, sim_kwargs, mpc_kwargs, checkpoint=None):
+    """
+    Run one simulation of the sweep and return its parameters and summary metrics.
+    With a checkpoint file the run is a branch: it continues from the checkpoint with the
+    parameters applied as a perturbation of the state at the fork.
+    """
+    sim_kwargs = {'log_barriers': False, **sim_kwargs}
+    if checkpoint is None:
+        sim = Simulation(scenario_num=int(params.get('scenario', 1)), **sim_kwargs)
+        sim.mpc = worker_mpc(params, sim.dt, mpc_kwargs)
+        apply_parameters(sim, params)
+    else:
+        snapshot = worker_checkpoint(checkpoint)
+        sim = Simulation.from_checkpoint(snapshot, mpc=worker_mpc(params, snapshot['dt'], mpc_kwargs), **sim_kwargs)
+        apply_parameters(sim, params, restart=False)
+
+    start = time.perf_counter()
+    sim.run(visualize=False, log_dir=None, verbose=False)
+    wall_time = time.perf_counter() - start
+
+    return {'run_id': run_id, 'failed': 0.0, **params, **summarize(sim, wall_time)}
+
+def load_results(path):
+    """Load a results file into a list of row dicts"""
+    data = np.load(path)
+    columns = {name: data[name] for name in data.files}
+    num_rows = len(columns['run_id'])
+    return [{name: col[k].item() for name, col in columns.items()} for k in range(num_rows)]
+
+def save_results(path, rows):
+    """
+    Write rows as one column array per field (pickle-free .npz). The file is written
+    next to the target and then renamed, so an interruption never leaves it truncated.
+    """
+    names = sorted(set().union(*rows)) if rows else ['run_id']
+    columns = {name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64) for name in names}
+    columns['run_id'] = columns['run_id'].astype(np.int64)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, path)
+
+def run_sweep(runs, out='sweep_results.npz', workers=None, sim_kwargs=None, mpc_kwargs=None, flush_every=10,
+              checkpoint=None):
+    """
+    Run every parameter set of runs on a process pool and stream the per-run summaries
+    into the columnar results file out. Runs completed in out are skipped and failed ones
+    are run again (resume).
+    With a checkpoint file every run is a branch forked from it (see run_one), so the
+    common prefix is simulated once instead of once per run.
+    """
+    sim_kwargs = dict(sim_kwargs or {})
+    mpc_kwargs = dict(mpc_kwargs or {})
+    rows = load_results(out) if os.path.exists(out) else []
+    rows = [row for row in rows if row.get('failed') != 1.0]  # Failed runs are queued again
+    done = {int(row['run_id']) for row in rows}
+    pending = [(run_id, params) for run_id, params in enumerate(runs) if run_id not in done]
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    futures = {}
+    try:
+        futures = {pool.submit(run_one, run_id, params, sim_kwargs, mpc_kwargs, checkpoint): (run_id, params)
+                   for run_id, params in pending}
+        for k, future in enumerate(as_completed(futures), 1):
+            run_id, params = futures[future]
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                print(f"Run {run_id} failed: {e}")
+                rows.append({'run_id': run_id, 'failed': 1.0, **params})
+            if k % flush_every == 0:
+                save_results(out, rows)
+    finally:
+        save_results(out, rows)
+        # Drop the queued runs on an interruption (shutdown(cancel_futures=True) needs Python 3.9)
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep over initial gaps, speeds and scenarios")
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--out', default='sweep_results.npz')
+    parser.add_argument('--sim-time', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-budget', type=float, default=None, help="Per-step MPC solve deadline [s]")
+    parser.add_argument('--table', default=None, help="Explicit-MPC table directory (see Explicit_Mpc.py)")
+    parser.add_argument('--fork-at', type=float, default=None,
+                        help="Simulate --scenario once up to this time [s] and fork every run from there")
+    parser.add_argument('--scenario', type=int, default=1, help="Scenario of the common prefix (with --fork-at)")
+    parser.add_argument('--terminate', action='store_true',
+                        help="End runs early on a collision, a resolved scenario or an ego standstill")
+    parser.add_argument('--cruise-window', type=float, default=None,
+                        help="Reuse the last plan while no vehicle is within this distance [m] in Lane Keeping")
+    args = parser.parse_args()
+
+    distributions = {
+        'scenario': [1, 2, 3],
+        'ego_vx': (20.0, 35.0),
+        'veh1_gap': (40.0, 200.0),
+        'veh1_vx': (10.0, 30.0),
+        'veh2_vx': (25.0, 40.0),
+    }
+    mpc_kwargs = {'time_budget': args.time_budget}
+    if args.table:
+        mpc_kwargs['table_dir'] = args.table
+    sim_kwargs = {'sim_time': args.sim_time, 'cruise_window': args.cruise_window}
+    if args.terminate:
+        sim_kwargs['terminate_when'] = default_predicates()
+
+    checkpoint = None
+    if args.fork_at is not None:
+        # Branches differ only after the fork: perturb the accelerations of the scenario vehicles
+        distributions = {
+            'veh1_ax': (-6.0, 0.0),
+            'veh2_ax': (-2.0, 2.0),
+        }
+        checkpoint = os.path.splitext(args.out)[0] + '_checkpoint.npz'
+        if not os.path.exists(checkpoint):
+            prefix = Simulation(scenario_num=args.scenario, sim_time=args.fork_at, log_barriers=False)
+            prefix.mpc = worker_mpc({}, prefix.dt, mpc_kwargs)
+            num_steps = int(args.fork_at / prefix.dt)
+            prefix.run(visualize=False, log_dir=None, verbose=False, checkpoint_steps=[num_steps])
+            save_checkpoint(checkpoint, prefix.checkpoints[num_steps])
+            print(f"Common prefix of {num_steps} steps checkpointed to {checkpoint}")
+
+    runs = random_runs(distributions, args.runs, seed=args.seed)
+    rows = run_sweep(runs, out=args.out, workers=args.workers, sim_kwargs=sim_kwargs,
+                     mpc_kwargs=mpc_kwargs, checkpoint=checkpoint)
+
+    collisions = sum(row.get('collision', 0) == 1 for row in rows)
+    print(f"{len(rows)} runs in {args.out}, {collisions} with a collision")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Termination predicates for Simulation(terminate_when=[...]): callables evaluated on the
+# simulation after every step, ending the run when one returns True. They are classes so
+# that configured instances can be sent to sweep worker processes.
+
+class Collision:
+    """The ego box overlaps the box of a surrounding vehicle"""
+    name = 'collision'
+
+    def __call__(self, sim):
+        ego = sim.ego_vehicle
+        traffic = sim.traffic
+        overlap_x = np.abs(traffic.x - ego.state[0]) < (ego.length + traffic.length) / 2
+        overlap_y = np.abs(traffic.y - ego.state[1]) < (ego.width + traffic.width) / 2
+        return bool(np.any(overlap_x & overlap_y))
+
+class EgoStopped:
+    """The ego has come to a standstill (longitudinal speed below v_min [m/s])"""
+    name = 'ego_stopped'
+
+    def __init__(self, v_min=0.1):
+        self.v_min = v_min
+
+    def __call__(self, sim):
+        return sim.ego_vehicle.state[2] < self.v_min
+
+class ScenarioResolved:
+    """
+    The maneuver is over: the FSM is in Lane Keeping, the ego has settled laterally in its
+    reference lane (within y_tol [m] of sim.y_ref and lateral speed below vy_tol [m/s]; the
+    commanded lateral acceleration may still press against the plant's velocity clipping),
+    and every vehicle is more than margin [m] away along x with a gap that cannot close under
+    its constant acceleration: behind, not faster than the ego and not accelerating, or ahead,
+    not slower and not braking.
+    """
+    name = 'scenario_resolved'
+
+    def __init__(self, vy_tol=0.05, margin=10.0, y_tol=0.25):
+        self.vy_tol = vy_tol
+        self.margin = margin
+        self.y_tol = y_tol
+
+    def __call__(self, sim):
+        ego = sim.ego_vehicle.state
+        traffic = sim.traffic
+        if sim.decision_maker.current_state != "Lane Keeping" or abs(ego[3]) > self.vy_tol:
+            return False
+        if abs(ego[1] - sim.y_ref) > self.y_tol:
+            return False
+        delta_x = traffic.x - ego[0]
+        behind = (delta_x < -self.margin) & (traffic.vx <= ego[2]) & (traffic.ax <= 0)
+        ahead = (delta_x > self.margin) & (traffic.vx >= ego[2]) & (traffic.ax >= 0)
+        return bool(np.all(behind | ahead))
+
+class LeftRegion:
+    """The ego has left the region of interest: x beyond x_max [m] or y off the road by more than y_margin [m]"""
+    name = 'left_region'
+
+    def __init__(self, x_max=np.inf, y_margin=0.5):
+        self.x_max = x_max
+        self.y_margin = y_margin
+
+    def __call__(self, sim):
+        x, y = sim.ego_vehicle.state[:2]
+        env = sim.environment
+        return bool(x > self.x_max or y < env.y_min - self.y_margin or y > env.y_max + self.y_margin)
+
+def default_predicates():
+    """Collision, resolved scenario and ego standstill: the predicates used by sweeps"""
+    return [Collision(), ScenarioResolved(), EgoStopped()]
@@ -1,43 +1,92 @@
 import numpy as np
 
+# lambda value of Eq. 10
+LAMBDA = np.exp(1.3170)
+
+def zeta_schedule(v_x, y_lat, mu=0.8, g=9.81, y_err=0.05, s=50):
+    """Barrier steepness zeta for a longitudinal velocity (scalar or array) (Equations 10-13)"""
+    v_x = np.maximum(v_x, 1e-3) if isinstance(v_x, np.ndarray) else max(v_x, 1e-3)  # Prevent division by zero
+
+    # Calculate maximum yaw rate (Eq. 11)
+    psi_dot_max = 0.85 * mu * g / v_x
+
+    # Calculate maximum curvature (Eq. 12)
+    rho_max = psi_dot_max / v_x
+
+    lambda_val = LAMBDA
+
+    # Calculate zeta_max (Eq. 10)
+    zeta_max = np.sqrt(rho_max * (lambda_val + 1)**3 / (y_lat * lambda_val * (lambda_val - 1)))
+
+    # Calculate zeta_min (Eq. 13)
+    zeta_min = -2 * np.log(y_err / (1 - y_err)) / s
+
+    # Use mean value for zeta
+    return (zeta_min + zeta_max) / 2
+
 class SigmoidBarrier:
-    def __init__(self, y_lat=3.5):
-        """Initialize sigmoid barrier with lateral offset"""
+    def __init__(self, y_lat=3.5, v_bucket=0.1):
+        """
+        Initialize sigmoid barrier with lateral offset.
+        zeta is memoized per velocity bucket: velocities are rounded to multiples of
+        v_bucket [m/s] first, so nearby velocities share one computation (None keys on
+        the exact velocity, which rarely repeats in a simulation).
+        """
         self.y_lat = y_lat
+        self.v_bucket = v_bucket
         self.zeta = None
-        
+        self._zeta_cache = {}  # (velocity or bucket, mu, g, y_err, s) -> zeta
+
     def optimize_zeta(self, v_x, mu=0.8, g=9.81, y_err=0.05, s=50):
         """
         Optimize zeta parameter based on vehicle dynamics (Equations 10-13)
         """
-        if v_x < 1e-3:  # Prevent division by zero
-            v_x = 1e-3
-        # Calculate maximum yaw rate (Eq. 11)
-        psi_dot_max = 0.85 * mu * g / v_x
-        
-        # Calculate maximum curvature (Eq. 12)
-        rho_max = psi_dot_max / v_x
-        
-        # Calculate lambda value
-        lambda_val = np.exp(1.3170)
-        
-        # Calculate zeta_max (Eq. 10)
-        zeta_max = np.sqrt(rho_max * (lambda_val + 1)**3 / (self.y_lat * lambda_val * (lambda_val - 1)))
-        
-        # Calculate zeta_min (Eq. 13)
-        zeta_min = -2 * np.log(y_err / (1 - y_err)) / s
-        
-        # Use mean value for zeta
-        self.zeta = (zeta_min + zeta_max) / 2
-        
+        v_x = float(v_x)
+        if self.v_bucket:
+            v_x = round(v_x / self.v_bucket) * self.v_bucket
+        key = (v_x, mu, g, y_err, s)
+        zeta = self._zeta_cache.get(key)
+        if zeta is None:
+            if len(self._zeta_cache) >= 4096:  # Bound the memo for continuously varying speeds
+                self._zeta_cache.clear()
+            zeta = self._zeta_cache[key] = float(zeta_schedule(v_x, self.y_lat, mu, g, y_err, s))
+        self.zeta = zeta
         return self.zeta
-        
+
+    def snapshot(self):
+        """Current zeta (the memo only caches values and is not part of the state)"""
+        return {'zeta': self.zeta}
+
+    def restore(self, snapshot):
+        """Return to the zeta of a snapshot"""
+        self.zeta = snapshot['zeta']
+
     def generate_barrier(self, delta_x, s_f, delta=1):
         """Generate sigmoid barrier value (Equation 23)"""
         if self.zeta is None:
             raise ValueError("Zeta parameter not optimized. Call optimize_zeta first.")
             
         # Sigmoid function (Eq. 23)
-        barrier = (delta * self.y_lat) / (1 + np.exp(-self.zeta * (-delta_x + s_f)))
+        barrier = (delta * self.y_lat) / (1 + np.exp(np.clip(-self.zeta * (-delta_x + s_f), -50, 50)))
         
         return barrier
+
+    def barrier_curves(self, x_grid, obs_x, s_f, delta=1, zeta=None):
+        """
+        Barrier offsets (Equation 23) for every vehicle, horizon stage and ego position in one call.
+
+        x_grid holds the ego x positions, shape (points,). obs_x holds the obstacle x positions,
+        shape (vehicles,) or (vehicles, stages). s_f and delta are scalars or per-stage arrays of
+        shape (stages,). Returns an array of shape (vehicles, stages, points); the barrier curve
+        of a vehicle is its y position plus this offset.
+        """
+        zeta = self.zeta if zeta is None else zeta
+        if zeta is None:
+            raise ValueError("Zeta parameter not optimized. Call optimize_zeta first.")
+        obs_x = np.asarray(obs_x, dtype=np.float64)
+        obs_x = obs_x[:, None, None] if obs_x.ndim == 1 else obs_x[:, :, None]  # Explicit stage axis, also for no vehicles
+        s_f = np.asarray(s_f, dtype=np.float64).reshape(1, -1, 1)
+        delta = np.asarray(delta, dtype=np.float64).reshape(1, -1, 1)
+        delta_x = obs_x - np.asarray(x_grid, dtype=np.float64)
+        # Clipped exponent: far away vehicles saturate the sigmoid instead of overflowing
+        return (delta * self.y_lat) / (1 + np.exp(np.clip(-zeta * (-delta_x + s_f), -50, 50)))
@@ -1,10 +1,107 @@
-from Mpc_Controller import MPC
 import numpy as np
 
+def integrate_point_mass(states, vx_max, dt, num_substeps=1):
+    """
+    Advance states of shape (6, n) by num_substeps point-mass steps of dt, holding the
+    accelerations in rows 4 and 5 (zero-order hold). All sub-steps and vehicles are
+    computed at once: with a constant acceleration and a velocity within [0, vx_max], the
+    per-step velocity clipping is the same as clipping the accumulated velocity. A velocity
+    starting outside the range is clipped after the first sub-step and continues from there.
+    Positions are the cumulative sum of the velocities. Returns the states after every
+    sub-step, shape (num_substeps, 6, n).
+    """
+    k = np.arange(1, num_substeps + 1).reshape((num_substeps,) + (1,) * (states.ndim - 1))
+    path = np.empty((num_substeps,) + states.shape)
+    path[:, 4:6] = states[4:6]
+
+    # Update velocities (Equations 8 from paper)
+    for row in (2, 3):
+        v0, dv = states[row], states[row + 2] * dt
+        path[:, row] = np.clip(v0 + k * dv, 0, vx_max)
+        outside = (v0 < 0) | (v0 > vx_max)
+        if np.any(outside):
+            v1 = np.clip(v0 + dv, 0, vx_max)
+            path[:, row] = np.where(outside, np.clip(v1 + (k - 1) * dv, 0, vx_max), path[:, row])
+
+    # Update positions
+    path[:, 0] = states[0] + dt * np.cumsum(path[:, 2], axis=0)
+    path[:, 1] = states[1] + dt * np.cumsum(path[:, 3], axis=0)
+    return path
+
+class TrajectoryStore:
+    def __init__(self, first, retention=None, decimation=1):
+        """
+        Recorded samples (e.g. vehicle states) in one contiguous array, starting with first.
+        Every decimation-th appended sample is stored, and with a retention only the last
+        retention stored samples are kept. A bounded store preallocates twice the retention
+        and moves the retained samples back to the front when it is full, so samples is
+        always a view and an append copies O(1) samples on average. An unbounded store
+        doubles its capacity when full. Views are valid until the next append.
+        """
+        first = np.asarray(first, dtype=np.float64)
+        if retention is not None and retention < 1:
+            raise ValueError(f"retention must be at least 1, got {retention}")
+        self.retention = retention
+        self.decimation = max(1, int(decimation))
+        self.buffer = np.empty((2 * retention if retention else 1,) + first.shape)
+        self.reset(first)
+
+    def reset(self, first):
+        """Drop every sample and start again from first"""
+        self.start = self.stop = 0  # Stored samples are buffer[start:stop]
+        self.count = 0              # Samples appended so far, stored or not
+        self.extend(np.asarray(first, dtype=np.float64)[None])
+
+    @property
+    def samples(self):
+        """Stored samples, oldest first (a view into the buffer)"""
+        return self.buffer[self.start:self.stop]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def extend(self, path):
+        """Append samples of shape (k,) + sample shape"""
+        # Samples with an index (since the first) that is a multiple of decimation are stored
+        kept = path[(-self.count) % self.decimation::self.decimation]
+        self.count += len(path)
+        if self.retention:
+            kept = kept[-self.retention:]
+        n = len(kept)
+        if self.stop + n > len(self.buffer):
+            if self.retention:
+                keep = min(len(self), self.retention - n)
+                self.buffer[:keep] = self.buffer[self.stop - keep:self.stop]
+                self.start, self.stop = 0, keep
+            else:
+                buffer = np.empty((max(2 * len(self.buffer), self.stop + n),) + self.buffer.shape[1:])
+                buffer[:self.stop] = self.buffer[:self.stop]
+                self.buffer = buffer
+        self.buffer[self.stop:self.stop + n] = kept
+        self.stop += n
+        if self.retention:
+            self.start = max(self.start, self.stop - self.retention)
+
+    def snapshot(self):
+        """Stored samples and the append count (Simulation.checkpoint)"""
+        return {'samples': self.samples.copy(), 'count': self.count}
+
+    def restore(self, snapshot):
+        """Return to the samples of a snapshot"""
+        samples = np.asarray(snapshot['samples'], dtype=np.float64)
+        if self.retention:
+            samples = samples[-self.retention:]
+        elif len(samples) > len(self.buffer):
+            self.buffer = np.empty((len(samples),) + self.buffer.shape[1:])
+        self.buffer[:len(samples)] = samples
+        self.start, self.stop = 0, len(samples)
+        self.count = int(snapshot['count'])
+
 class Vehicle:
-    def __init__(self, initial_state, length=1, width=0.5, id=None):
+    def __init__(self, initial_state, length=1, width=0.5, id=None, vx_max=40.0, retention=None, decimation=1):
         """
-        Initialize a vehicle with state [x, y, v_x, v_y, a_x, a_y]
+        Initialize a vehicle with state [x, y, v_x, v_y, a_x, a_y] and speed limit vx_max.
+        retention and decimation configure its TrajectoryStore.
         """
         # Ensure state has 6 elements
         if len(initial_state) != 6:
@@ -13,22 +110,160 @@ class Vehicle:
         self.length = length
         self.width = width
         self.id = id
-        self.trajectory = [self.state.copy()]
-        self.mpc = MPC()
-        
-    def update(self, a_x, a_y, dt):
-        """Update vehicle state using point-mass model"""
-        x, y, v_x, v_y, _, _ = self.state
-        
-        # Update velocities (Equations 8 from paper)
-        v_x_new = np.clip(v_x + a_x * dt, 0, self.mpc.vx_max)
-        v_y_new = np.clip(v_y + a_y * dt, 0, self.mpc.vx_max)
-        
-        # Update positions
-        x_new = x + v_x_new * dt
-        y_new = y + v_y_new * dt
+        self.vx_max = vx_max  # Plant speed limit [m/s]
+        self.trajectory_store = TrajectoryStore(self.state, retention, decimation)
+
+    @property
+    def trajectory(self):
+        """Recorded states, shape (samples, 6), a view into the trajectory store"""
+        return self.trajectory_store.samples
         
-        # Update state
-        self.state = np.array([x_new, y_new, v_x_new, v_y_new, a_x, a_y])
-        self.trajectory.append(self.state.copy())
-        
\ No newline at end of file
+    def update(self, a_x, a_y, dt, num_substeps=1):
+        """Update vehicle state using point-mass model (num_substeps steps of dt with the inputs held)"""
+        state = self.state.copy()
+        state[4], state[5] = a_x, a_y
+        self.set_path(integrate_point_mass(state, self.vx_max, dt, num_substeps))
+
+    def set_path(self, path):
+        """Record integrated states of shape (num_substeps, 6); the last one becomes the current state"""
+        self.state = path[-1].copy()
+        self.trajectory_store.extend(path)
+
+    def snapshot(self):
+        """Current state and recorded trajectory (Simulation.checkpoint)"""
+        return {'state': self.state.copy(), 'trajectory': self.trajectory_store.snapshot()}
+
+    def restore(self, snapshot):
+        """Return to the state and trajectory of a snapshot"""
+        self.state = np.array(snapshot['state'], dtype=np.float64)
+        self.trajectory_store.restore(snapshot['trajectory'])
+
+class TrafficState:
+    # Row layout of the state array, one column per vehicle
+    X, Y, VX, VY, AX, AY = range(6)
+
+    def __init__(self, states=None, length=1, width=0.5, ids=None, vx_max=40.0, retention=None, decimation=1):
+        """
+        Structure-of-arrays container for all non-ego vehicles.
+        states has shape (6, n) so each state component is contiguous;
+        length, width and vx_max are scalars or per-vehicle arrays.
+        retention and decimation configure the TrajectoryStore of the history.
+        """
+        self.states = np.zeros((6, 0)) if states is None else np.array(states, dtype=np.float64).reshape(6, -1)
+        n = self.states.shape[1]
+        self.length = np.broadcast_to(np.asarray(length, dtype=np.float64), (n,)).copy()
+        self.width = np.broadcast_to(np.asarray(width, dtype=np.float64), (n,)).copy()
+        self.vx_max = np.broadcast_to(np.asarray(vx_max, dtype=np.float64), (n,)).copy()
+        self.ids = list(ids) if ids is not None else list(range(n))
+        self.index = {veh_id: i for i, veh_id in enumerate(self.ids)}  # vehicle id -> column
+        self.history_store = TrajectoryStore(self.states, retention, decimation)
+        self.vehicles = [VehicleView(self, i) for i in range(n)]
+
+    @classmethod
+    def from_vehicles(cls, vehicles, **kwargs):
+        """Build the container from a list of Vehicle objects (kwargs as for __init__)"""
+        vehicles = list(vehicles)
+        states = np.array([vehicle.state for vehicle in vehicles]).T.reshape(6, len(vehicles))
+        return cls(states,
+                   length=[vehicle.length for vehicle in vehicles],
+                   width=[vehicle.width for vehicle in vehicles],
+                   ids=[vehicle.id for vehicle in vehicles],
+                   vx_max=[vehicle.vx_max for vehicle in vehicles], **kwargs)
+
+    def __len__(self):
+        return self.states.shape[1]
+
+    @property
+    def history(self):
+        """Recorded states, shape (samples, 6, n), a view into the history store"""
+        return self.history_store.samples
+
+    @property
+    def x(self):
+        return self.states[self.X]
+
+    @property
+    def y(self):
+        return self.states[self.Y]
+
+    @property
+    def vx(self):
+        return self.states[self.VX]
+
+    @property
+    def vy(self):
+        return self.states[self.VY]
+
+    @property
+    def ax(self):
+        return self.states[self.AX]
+
+    @property
+    def ay(self):
+        return self.states[self.AY]
+
+    def update(self, dt, a_x=None, a_y=None, num_substeps=1):
+        """
+        Advance all vehicles with the point-mass model, vectorized over vehicles and
+        num_substeps steps of dt. Accelerations default to each vehicle's current
+        (constant) acceleration.
+        """
+        if a_x is not None:
+            self.ax[:] = a_x
+        if a_y is not None:
+            self.ay[:] = a_y
+        self.set_path(integrate_point_mass(self.states, self.vx_max, dt, num_substeps))
+
+    def set_path(self, path):
+        """Record integrated states of shape (num_substeps, 6, n); the last one becomes the current state"""
+        self.states[:] = path[-1]
+        self.history_store.extend(path)
+
+    def snapshot(self):
+        """Current states and recorded history (Simulation.checkpoint)"""
+        return {'ids': [str(veh_id) for veh_id in self.ids], 'states': self.states.copy(),
+                'history': self.history_store.snapshot()}
+
+    def restore(self, snapshot):
+        """
+        Return to the states and history of a snapshot of the same vehicles. The states are
+        written in place, so existing VehicleViews and SpatialIndexes stay attached.
+        """
+        if snapshot['ids'] != [str(veh_id) for veh_id in self.ids]:
+            raise ValueError(f"Snapshot vehicles {snapshot['ids']} do not match {self.ids}")
+        self.states[:] = snapshot['states']
+        self.history_store.restore(snapshot['history'])
+
+    def trajectory(self, i):
+        """Trajectory of vehicle column i as an array of shape (samples, 6), a view into the history"""
+        return self.history[:, :, i]
+
+class VehicleView:
+    def __init__(self, traffic, i):
+        """Thin Vehicle-compatible view of column i of a TrafficState"""
+        self.traffic = traffic
+        self.i = i
+
+    @property
+    def state(self):
+        return self.traffic.states[:, self.i]
+
+    @property
+    def length(self):
+        return self.traffic.length[self.i]
+
+    @property
+    def width(self):
+        return self.traffic.width[self.i]
+
+    @property
+    def id(self):
+        return self.traffic.ids[self.i]
+
+    @property
+    def vx_max(self):
+        return self.traffic.vx_max[self.i]
+
+    @property
+    def trajectory(self):
+        return self.traffic.trajectory(self.i)